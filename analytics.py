@@ -0,0 +1,53 @@
+from date_check import is_date
+from consts import DB_TOP_CALLERS_REQUEST, DB_CITY_MONTHS_REQUEST, DB_DAY_NIGHT_REQUEST
+from database import connect
+from profiling import instrumented
+
+MIN_MONTH_KEY = '0000-00'
+MAX_MONTH_KEY = '9999-99'
+
+
+def month_key(text, default):
+    # mm.yyyy -> yyyy-mm, the form months have in the rollups; an empty
+    # bound leaves that end of the range open.
+    if not text:
+        return default
+    if not is_date('01.' + text):
+        raise ValueError(text)
+    return f'{text[3:]}-{text[:2]}'
+
+
+def month_range(month_from=None, month_to=None):
+    return month_key(month_from, MIN_MONTH_KEY), month_key(month_to, MAX_MONTH_KEY)
+
+
+def top_callers(connection, count):
+    # (caller_id, phone_number, calls, day minutes, night minutes, minutes)
+    # of the `count` callers with the most minutes, read through the index
+    # of caller_totals.
+    return connection.execute(DB_TOP_CALLERS_REQUEST, (count,)).fetchall()
+
+
+def city_months(connection, month_from=None, month_to=None):
+    # (month, city_id, name, calls, day minutes, night minutes, minutes) for
+    # every city and month of the range.
+    return connection.execute(DB_CITY_MONTHS_REQUEST, month_range(month_from, month_to)).fetchall()
+
+
+def day_night(connection, month_from=None, month_to=None):
+    # (month, calls, day minutes, night minutes, minutes) for every month of
+    # the range.
+    return connection.execute(DB_DAY_NIGHT_REQUEST, month_range(month_from, month_to)).fetchall()
+
+
+@instrumented(rows=lambda result: sum(map(len, result)))
+def analytics_report(filename, count, month_from=None, month_to=None, task=None):
+    # All three views of a file. They are read from the rollups that the
+    # triggers of conversations keep up to date, so no conversation is
+    # read here.
+    connection = connect(filename)
+    try:
+        return (top_callers(connection, count), city_months(connection, month_from, month_to),
+                day_night(connection, month_from, month_to))
+    finally:
+        connection.close()
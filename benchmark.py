@@ -0,0 +1,246 @@
+# Замеры времени основных операций окна на сгенерированных базах.
+# python benchmark.py [--sizes 10000 100000 1000000] [--output result.json] [--baseline baseline.json]
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+CALLERS_PER_CONVERSATION = 10
+SEARCH_TEXT = 'новосибирск'
+SEARCH_COLUMN = 3
+# A search of conversations: the dates of a year pasted into Дата, then a
+# part of the time typed a letter at a time.
+CONVERSATION_DATE_COLUMN = 3
+CONVERSATION_DATES = '01.01.2020..31.12.2020'
+CONVERSATION_SEARCH_COLUMN = 5
+CONVERSATION_SEARCH_TEXT = 'ноч'
+# The date and the minutes of conversations; a cell of the minutes holds a
+# text that is not a number while they are sorted, as a cell being
+# corrected does.
+SORT_COLUMNS = (3, 4)
+SORT_BAD_NUMBER = '²'
+REPEAT_COUNT = 20
+STARTUP_REPEAT_COUNT = 5
+STARTUP_TIMEOUT = 10
+REGRESSION_THRESHOLD = 0.2
+# Timings that grew by less than this many seconds are treated as noise.
+MIN_REGRESSION_TIME = 0.001
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Замеры времени операций окна')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='количество переговоров в тестовых базах')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'practice2024_benchmark'),
+                        help='папка для тестовых баз')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help='файл с прошлыми результатами для сравнения')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='допустимое относительное замедление')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    parser.add_argument('--startup', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+def fixture(directory, size):
+    # Fixtures are made once with a fixed seed and reused by later runs.
+    from db_init import parse_args as generator_args, generate
+
+    filename = os.path.join(directory, f'conversations_{size}.db')
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        generate(generator_args([filename, '--seed', 'benchmark', '--conversations', str(size),
+                                 '--callers', str(max(size // CALLERS_PER_CONVERSATION, 1))]))
+    return filename
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def summary(timings):
+    return {'mean': sum(timings) / len(timings), 'max': max(timings), 'count': len(timings)}
+
+
+def run_benchmark(filename):
+    # Runs in its own process, so that the peak RSS belongs to one size.
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import Qt
+    import main
+
+    app = QApplication(sys.argv)
+    main.QFileDialog.getOpenFileName = staticmethod(lambda *args, **kwargs: (filename, ''))
+    main.QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (filename, ''))
+    messages = []
+
+    window = main.MainWindow()
+    window.show_message = messages.append
+    window.show()
+    app.processEvents()
+
+    results = {'action_on_open': timed(window.action_on_open),
+               'check_for_errors': timed(window.check_for_errors)}
+
+    window.action_search.setChecked(True)
+    results['action_on_search'] = timed(window.action_on_search, True)
+    results['update_result'] = summary(type_search(window, window.searches[0], SEARCH_COLUMN, SEARCH_TEXT))
+    search = window.searches[main.TABLE_CONVERSATIONS_I]
+    search.item(0, CONVERSATION_DATE_COLUMN).setText(CONVERSATION_DATES)
+    keystrokes = [timed(window.update_result)]
+    keystrokes += type_search(window, search, CONVERSATION_SEARCH_COLUMN, CONVERSATION_SEARCH_TEXT)
+    results['update_result_conversations'] = summary(keystrokes)
+    window.action_search.setChecked(False)
+    window.action_on_search(False)
+
+    window.tab_widget.setCurrentIndex(main.TABLE_CONVERSATIONS_I)
+    results['action_on_add'] = summary([timed(window.action_on_add) for _ in range(REPEAT_COUNT)])
+    table = window.tables[main.TABLE_CONVERSATIONS_I]
+    deletes = []
+    for _ in range(REPEAT_COUNT):
+        table.setCurrentIndex(table.model().index(0, 0))
+        deletes.append(timed(window.action_on_delete))
+    results['action_on_delete'] = summary(deletes)
+    model, col = table.model(), SORT_COLUMNS[-1]
+    slot = model.slot(0)
+    text = model.data(model.index(0, col))
+    model.setData(model.index(0, col), SORT_BAD_NUMBER)
+    results['action_on_sort'] = summary([timed(window.action_on_sort, sort_col, Qt.AscendingOrder)
+                                         for sort_col in SORT_COLUMNS])
+    model.setData(model.index(model.row_of(slot), col), text)
+    results['action_on_save'] = timed(window.action_on_save)
+    results['messages'] = messages
+    results['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    window.close()
+    results['bytes_per_row'] = bytes_per_row(filename)
+    return results
+
+
+def type_search(window, search, col, text):
+    # Times the search after every letter of `text` typed into the column.
+    keystrokes = []
+    for length in range(1, len(text) + 1):
+        search.item(0, col).setText(text[:length])
+        keystrokes.append(timed(window.update_result))
+    return keystrokes
+
+
+def bytes_per_row(filename):
+    # Memory the loaded conversations take in a DataTable, per row, without
+    # the rows as they were read from the file.
+    import tracemalloc
+    from consts import TABLE_CONVERSATIONS_I
+    from database import connect, TableReader
+    from data_store import DataTable
+
+    connection = connect(filename)
+    try:
+        rows = TableReader(connection, TABLE_CONVERSATIONS_I).fetch_all()
+    finally:
+        connection.close()
+    tracemalloc.start()
+    try:
+        table = DataTable(TABLE_CONVERSATIONS_I)
+        table.load(rows)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size / max(len(rows), 1)
+
+
+def run_startup():
+    # Runs in a fresh process, so that the imports are timed as well. The
+    # first paint is marked by the window itself.
+    start = time.perf_counter()
+    from PyQt5.QtWidgets import QApplication
+    import main
+
+    imported = time.perf_counter()
+    app = QApplication(sys.argv)
+    window = main.MainWindow()
+    window.show()
+    while not window.painted and time.perf_counter() - start < STARTUP_TIMEOUT:
+        app.processEvents()
+    steps = dict(main.startup.steps)
+    window.close()
+    return {'imports': imported - start, 'time_to_first_paint': steps['first_paint'] - start}
+
+
+def startup_times():
+    # The fastest of a few starts; a single start is too noisy to compare.
+    runs = []
+    for _ in range(STARTUP_REPEAT_COUNT):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--startup'],
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return {name: min(run[name] for run in runs) for name in runs[0]}
+
+
+def run_size(args, size):
+    # The copy is opened and saved, so the fixture stays unchanged.
+    source = fixture(args.fixtures, size)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'benchmark.db')
+        shutil.copy(source, filename)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', filename],
+                                check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def metrics(results, prefix=''):
+    # Flattens the results into name -> number, e.g. sizes.10000.update_result.max.
+    for name, value in results.items():
+        if isinstance(value, dict):
+            yield from metrics(value, f'{prefix}{name}.')
+        elif isinstance(value, (int, float)) and not name.endswith('count'):
+            yield f'{prefix}{name}', value
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    old_metrics = dict(metrics(baseline))
+    for name, value in metrics(results):
+        old_value = old_metrics.get(name)
+        if not old_value or value <= old_value * (1 + threshold):
+            continue
+        if name.endswith('_kb') or value - old_value > MIN_REGRESSION_TIME:
+            regressions.append((name, old_value, value))
+    return regressions
+
+
+def main(args):
+    if args.run:
+        print(json.dumps(run_benchmark(args.run)))
+        return 0
+    if args.startup:
+        print(json.dumps(run_startup()))
+        return 0
+
+    results = {'python': sys.version.split()[0], 'startup': startup_times(), 'sizes': {}}
+    print('startup', json.dumps(results['startup']))
+    for size in args.sizes:
+        results['sizes'][str(size)] = run_size(args, size)
+        print(size, json.dumps(results['sizes'][str(size)], ensure_ascii=False))
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for name, old_value, value in regressions:
+            print(f'Замедление {name}: {old_value:.4g} -> {value:.4g}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
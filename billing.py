@@ -0,0 +1,78 @@
+import sqlite3
+from itertools import chain
+from operator import add, itemgetter
+from date_check import date_to_iso
+from consts import DB_CALL_COSTS_REQUEST, DB_BILLING_REQUESTS, PROGRESS_STEPS, ID_COLUMN
+from database import connect, conversation_sources, OperationCancelled, MIN_DATE_KEY, MAX_DATE_KEY
+from profiling import instrumented
+
+
+def date_key(text, default):
+    # dd.mm.yyyy -> yyyy-mm-dd, the form dates are stored in; an empty
+    # bound leaves that end of the range open.
+    if not text:
+        return default
+    iso = date_to_iso(text)
+    if iso is None:
+        raise ValueError(text)
+    return iso
+
+
+def date_range(date_from=None, date_to=None):
+    return date_key(date_from, MIN_DATE_KEY), date_key(date_to, MAX_DATE_KEY)
+
+
+def run_request(connection, request, date_from, date_to):
+    # The rows of the request for every view conversation_sources() gives.
+    first, last = date_range(date_from, date_to)
+    return [connection.execute(request.format(source), (first, last)).fetchall()
+            for source in conversation_sources(connection, first, last)]
+
+
+def add_up(results):
+    # (key, name, numbers...) rows of several views summed by key.
+    if len(results) == 1:
+        return results[0]
+    totals = {}
+    for row in chain.from_iterable(results):
+        total = totals.get(row[0])
+        totals[row[0]] = row if total is None else (*row[:2], *map(add, total[2:], row[2:]))
+    return [totals[key] for key in sorted(totals)]
+
+
+def call_costs(connection, date_from=None, date_to=None):
+    # Rows of conversations with the cost of the call appended.
+    results = run_request(connection, DB_CALL_COSTS_REQUEST, date_from, date_to)
+    if len(results) == 1:
+        return results[0]
+    return sorted(chain.from_iterable(results), key=itemgetter(ID_COLUMN))
+
+
+def caller_totals(connection, date_from=None, date_to=None):
+    # (caller_id, phone_number, calls, minutes, cost) for every caller that
+    # called in the range.
+    return add_up(run_request(connection, DB_BILLING_REQUESTS[0], date_from, date_to))
+
+
+def city_revenue(connection, date_from=None, date_to=None):
+    # (city_id, name, calls, minutes, revenue) for every city called in the
+    # range.
+    return add_up(run_request(connection, DB_BILLING_REQUESTS[1], date_from, date_to))
+
+
+@instrumented(rows=lambda result: sum(map(len, result)))
+def billing_report(filename, date_from=None, date_to=None, task=None):
+    # Both totals of a file; the sums are done by SQLite in one pass over
+    # conversations each, and over the partitions the range reaches. A
+    # task can interrupt a running query.
+    connection = connect(filename)
+    if task is not None:
+        connection.set_progress_handler(task.is_cancelled, PROGRESS_STEPS)
+    try:
+        return caller_totals(connection, date_from, date_to), city_revenue(connection, date_from, date_to)
+    except sqlite3.OperationalError:
+        if task is not None and task.is_cancelled():
+            raise OperationCancelled
+        raise
+    finally:
+        connection.close()
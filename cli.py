@@ -0,0 +1,184 @@
+# Работа с файлом базы без окна и без PyQt:
+# python -m cli validate data.db
+# python -m cli import data.db conversations calls.csv [--report rejected.csv]
+# python -m cli export data.db conversations calls.jsonl
+# python -m cli query data.db conversations --filter date=01.01.2020..31.12.2020 --filter time==ночь
+# python -m cli report data.db [--date-from 01.01.2020] [--date-to 31.12.2020]
+# python -m cli analytics data.db [--top 20] [--month-from 01.2020] [--month-to 12.2020]
+# python -m cli split data.db [--by year|month]
+import argparse
+import csv
+import sys
+from consts import DB_TABLE_NAMES, DB_COLUMN_NAMES, BILLING_HEADERS, ERROR_MESSAGES, DATA_CORRECT, \
+    IMPORT_RESULT_MESSAGE, REJECTED_REPORT_MESSAGE, EXPORT_RESULT_MESSAGE, CLI_ERROR_LINE, CLI_COLUMN_ERROR, \
+    CLI_DATE_ERROR, CLI_VALID_MESSAGE, CLI_MONTH_ERROR, ANALYTICS_HEADERS, DEFAULT_TOP_CALLERS, CLI_SPLIT_LINE, \
+    PARTITION_PERIODS
+from database import connect, load_tables, ensure_search_indexes, QueryReader
+from validation import Validator
+from transfer import import_table, export_table, report_filename
+from billing import billing_report, date_range
+from analytics import analytics_report, month_range
+from partitions import split_file
+
+MAX_ERROR_LINES = 20
+
+
+def validate(args):
+    data_tables = load_tables(args.database)
+    validator = Validator(data_tables)
+    for i, data_table in enumerate(data_tables):
+        validator.rows_added(i, range(data_table.slot_count()))
+
+    status = validator.status()
+    print(CLI_VALID_MESSAGE if status == DATA_CORRECT else ERROR_MESSAGES.get(status))
+    cells = sorted((i, slot, col, status) for i, data_table in enumerate(data_tables)
+                   for (slot, col), status in data_table.invalid.items())
+    for i, slot, col, status in cells[:args.limit]:
+        row = data_tables[i].row_data(slot)
+        print(CLI_ERROR_LINE.format(DB_TABLE_NAMES[i], row[0], DB_COLUMN_NAMES[i][col], row[col],
+                                    ERROR_MESSAGES.get(status)))
+    return 0 if status == DATA_CORRECT else 1
+
+
+def import_file(args):
+    index = DB_TABLE_NAMES.index(args.table)
+    report = args.report or report_filename(args.file)
+    imported, rejected = import_table(args.database, index, args.file, report)
+    print(IMPORT_RESULT_MESSAGE.format(imported, rejected))
+    if rejected:
+        print(REJECTED_REPORT_MESSAGE.format(report))
+    return 0 if not rejected else 1
+
+
+def export_file(args):
+    index = DB_TABLE_NAMES.index(args.table)
+    print(EXPORT_RESULT_MESSAGE.format(export_table(args.database, index, args.file)))
+    return 0
+
+
+def query(args):
+    # The filters are the texts of the search row of the window, given as
+    # column=text, and are run by SQLite like "Искать в файле".
+    index = DB_TABLE_NAMES.index(args.table)
+    names = DB_COLUMN_NAMES[index]
+    filters = [''] * len(names)
+    for item in args.filter:
+        name, _, text = item.partition('=')
+        if name not in names:
+            print(CLI_COLUMN_ERROR.format(name, ', '.join(names)), file=sys.stderr)
+            return 2
+        filters[names.index(name)] = text
+
+    connection = connect(args.database)
+    try:
+        ensure_search_indexes(connection)
+        reader = QueryReader(connection, index, filters)
+        writer = csv.writer(sys.stdout)
+        writer.writerow(names)
+        count = 0
+        while not reader.done and (args.limit is None or count < args.limit):
+            rows = reader.fetch()
+            if args.limit is not None:
+                rows = rows[:args.limit - count]
+            writer.writerows(rows)
+            count += len(rows)
+    finally:
+        connection.close()
+    return 0
+
+
+def report(args):
+    try:
+        date_range(args.date_from, args.date_to)
+    except ValueError as e:
+        print(CLI_DATE_ERROR.format(e), file=sys.stderr)
+        return 2
+    writer = csv.writer(sys.stdout)
+    for headers, rows in zip(BILLING_HEADERS, billing_report(args.database, args.date_from, args.date_to)):
+        writer.writerow(headers)
+        writer.writerows(rows)
+        writer.writerow(())
+    return 0
+
+
+def analytics(args):
+    try:
+        month_range(args.month_from, args.month_to)
+    except ValueError as e:
+        print(CLI_MONTH_ERROR.format(e), file=sys.stderr)
+        return 2
+    writer = csv.writer(sys.stdout)
+    for headers, rows in zip(ANALYTICS_HEADERS, analytics_report(args.database, args.top, args.month_from,
+                                                                 args.month_to)):
+        writer.writerow(headers)
+        writer.writerows(rows)
+        writer.writerow(())
+    return 0
+
+
+def split(args):
+    # Conversations of past periods go into partition files next to the
+    # database; the current period stays in it.
+    for name, count, path in split_file(args.database, args.by):
+        print(CLI_SPLIT_LINE.format(name, count, path))
+    return 0
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Работа с файлом базы без окна')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('validate', help='проверить все таблицы файла')
+    command.add_argument('database')
+    command.add_argument('--limit', type=int, default=MAX_ERROR_LINES, help='сколько ошибок вывести')
+    command.set_defaults(function=validate)
+
+    command = commands.add_parser('import', help='добавить строки из CSV или JSONL')
+    command.add_argument('database')
+    command.add_argument('table', choices=DB_TABLE_NAMES)
+    command.add_argument('file', help='*.csv или *.jsonl')
+    command.add_argument('--report', help='файл для отклонённых строк (по умолчанию <файл>.rejected.csv)')
+    command.set_defaults(function=import_file)
+
+    command = commands.add_parser('export', help='сохранить таблицу в CSV или JSONL')
+    command.add_argument('database')
+    command.add_argument('table', choices=DB_TABLE_NAMES)
+    command.add_argument('file', help='*.csv или *.jsonl')
+    command.set_defaults(function=export_file)
+
+    command = commands.add_parser('query', help='вывести строки таблицы, подходящие под фильтры, в CSV')
+    command.add_argument('database')
+    command.add_argument('table', choices=DB_TABLE_NAMES)
+    command.add_argument('--filter', action='append', default=[], metavar='COLUMN=TEXT',
+                         help='фильтр столбца в синтаксисе строки поиска')
+    command.add_argument('--limit', type=int)
+    command.set_defaults(function=query)
+
+    command = commands.add_parser('report', help='стоимость звонков по абонентам и городам в CSV')
+    command.add_argument('database')
+    command.add_argument('--date-from')
+    command.add_argument('--date-to')
+    command.set_defaults(function=report)
+
+    command = commands.add_parser('analytics', help='абоненты с наибольшим числом минут, минуты по городам и '
+                                                    'месяцам в CSV')
+    command.add_argument('database')
+    command.add_argument('--top', type=int, default=DEFAULT_TOP_CALLERS, help='сколько абонентов вывести')
+    command.add_argument('--month-from', help='мм.гггг')
+    command.add_argument('--month-to', help='мм.гггг')
+    command.set_defaults(function=analytics)
+
+    command = commands.add_parser('split', help='перенести разговоры прошлых лет или месяцев в отдельные файлы')
+    command.add_argument('database')
+    command.add_argument('--by', choices=PARTITION_PERIODS, default='year')
+    command.set_defaults(function=split)
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+from array import array
+from functools import lru_cache
+from date_check import date_to_ordinal, ordinal_to_date, NO_DATE
+from filters import number_key, date_key, MISSING
+from consts import STORE_NUMBER, STORE_DIGITS, STORE_DATE, STORE_CATEGORY
+
+# Integer arrays start with the smallest type and are widened when a value
+# does not fit, so a column of minutes or city codes takes a byte or two
+# per row.
+TYPECODES = ('b', 'h', 'i', 'q')
+MAX_DIGITS = 17
+
+
+def widened(values, low, high):
+    # A copy of `values` in the smallest type that also holds low..high.
+    for typecode in TYPECODES[TYPECODES.index(values.typecode):]:
+        bits = array(typecode).itemsize * 8 - 1
+        if -2 ** bits <= low and high < 2 ** bits:
+            return array(typecode, values)
+    raise OverflowError(low if low < 0 else high)
+
+
+def put(values, i, value):
+    # values[i] = value, appended if i is the length of the array; returns
+    # the array, which is a new one if it had to be widened.
+    try:
+        if i == len(values):
+            values.append(value)
+        else:
+            values[i] = value
+    except OverflowError:
+        values = widened(values, value, value)
+        return put(values, i, value)
+    return values
+
+
+def put_all(values, items):
+    # Appends the integers of the list `items`, widening like put().
+    try:
+        values.extend(array(values.typecode, items))
+    except OverflowError:
+        values = widened(values, min(items), max(items))
+        values.extend(array(values.typecode, items))
+    return values
+
+
+@lru_cache(maxsize=1 << 16)
+def date_text(ordinal):
+    return ordinal_to_date(ordinal)
+
+
+class NumberColumn:
+    # Numbers in the form str(int) gives them; any other text of the column
+    # (a cell that is being corrected, a number with leading zeros) is kept
+    # as it is in `overflow`.
+    native_key = staticmethod(number_key)
+
+    def __init__(self):
+        self.values = array(TYPECODES[0])
+        self.overflow = {}
+
+    def encode(self, text):
+        try:
+            value = int(text)
+        except ValueError:
+            return None
+        return value if str(value) == text and -2 ** 63 <= value < 2 ** 63 else None
+
+    def get(self, slot):
+        if slot in self.overflow:
+            return self.overflow[slot]
+        return str(self.values[slot])
+
+    def set(self, slot, text):
+        value = self.encode(text)
+        if value is None:
+            self.overflow[slot] = text
+            value = 0
+        else:
+            self.overflow.pop(slot, None)
+        self.values = put(self.values, slot, value)
+
+    def extend(self, items):
+        # Values as read from the file; integers go into the array at once.
+        try:
+            self.values = put_all(self.values, items)
+            return
+        except (TypeError, OverflowError):
+            pass
+        for item in items:
+            self.set(len(self.values), str(item))
+
+    def keys(self, key):
+        # key(text) of every slot, as an array('q').
+        if key is not self.native_key:
+            return array('q', (key(self.get(slot)) for slot in range(len(self.values))))
+        keys = self.native_keys()
+        for slot, text in self.overflow.items():
+            keys[slot] = key(text)
+        return keys
+
+    def text_keys(self, key):
+        # key(text) of every slot, as a list, for keys that are not integers.
+        return [key(self.get(slot)) for slot in range(len(self.values))]
+
+    def lower_texts(self):
+        return [self.get(slot).lower() for slot in range(len(self.values))]
+
+    def native_keys(self):
+        keys = array('q', self.values)
+        if keys and (min(keys) < 0 or max(keys) >= 10 ** 18):
+            for slot, value in enumerate(keys):
+                if not 0 <= value < 10 ** 18:
+                    keys[slot] = MISSING
+        return keys
+
+
+class DigitsColumn(NumberColumn):
+    # Strings of digits that may start with zeros (a TIN), kept as the
+    # number written by a 1 followed by the digits.
+    native_key = None
+
+    def encode(self, text):
+        if len(text) > MAX_DIGITS or not text.isdigit() or not text.isascii():
+            return None
+        return int('1' + text)
+
+    def get(self, slot):
+        if slot in self.overflow:
+            return self.overflow[slot]
+        return str(self.values[slot])[1:]
+
+    def extend(self, items):
+        for item in items:
+            self.set(len(self.values), str(item))
+
+
+class DateColumn(NumberColumn):
+    # Dates as ordinals; texts that are not dates go to `overflow`.
+    native_key = staticmethod(date_key)
+
+    def __init__(self):
+        super().__init__()
+        self.values = array('i')
+
+    def encode(self, text):
+        ordinal = date_to_ordinal(text)
+        return ordinal if ordinal != NO_DATE else None
+
+    def get(self, slot):
+        if slot in self.overflow:
+            return self.overflow[slot]
+        return date_text(self.values[slot])
+
+    def extend(self, items):
+        start = len(self.values)
+        ordinals = array('i', map(date_to_ordinal, map(str, items)))
+        if NO_DATE in ordinals:
+            for i, ordinal in enumerate(ordinals):
+                if ordinal == NO_DATE:
+                    self.overflow[start + i] = str(items[i])
+        self.values.extend(ordinals)
+
+    def native_keys(self):
+        return array('q', self.values)
+
+
+class CategoryColumn:
+    # Texts as codes into `strings`, the distinct texts of the column, so
+    # a city name or a time of day repeated in many rows is stored once.
+    def __init__(self):
+        self.values = array(TYPECODES[0])
+        self.strings = []
+        self.codes = {}
+
+    def code(self, text):
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.strings)
+            self.strings.append(text)
+        return code
+
+    def get(self, slot):
+        return self.strings[self.values[slot]]
+
+    def set(self, slot, text):
+        self.values = put(self.values, slot, self.code(text))
+
+    def extend(self, items):
+        self.values = put_all(self.values, [self.code(str(item)) for item in items])
+
+    def keys(self, key):
+        keys = [key(text) for text in self.strings]
+        return array('q', (keys[code] for code in self.values))
+
+    def text_keys(self, key):
+        keys = [key(text) for text in self.strings]
+        return [keys[code] for code in self.values]
+
+    def lower_texts(self):
+        strings = [text.lower() for text in self.strings]
+        return [strings[code] for code in self.values]
+
+
+def make_column(storage):
+    return {STORE_NUMBER: NumberColumn, STORE_DIGITS: DigitsColumn, STORE_DATE: DateColumn,
+            STORE_CATEGORY: CategoryColumn}[storage]()
@@ -1,30 +1,108 @@
-from PyQt5.QtGui import QBrush, QColor
-from PyQt5.QtCore import QRegExp
-from date_check import DateCheck
-
-WHITE = QBrush(QColor(0xFFFFFF))
-RED = QBrush(QColor(0xFFC7CE))
+WHITE = 0xFFFFFF
+RED = 0xFFC7CE
 
 ID_COLUMN = 0
 CALLER_ID_COLUMN = 1
 CITY_ID_COLUMN = 2
+TABLE_CALLERS_I = 0
+TABLE_CITIES_I = 1
 TABLE_CONVERSATIONS_I = 2
+FOREIGN_KEYS = {CALLER_ID_COLUMN: TABLE_CALLERS_I, CITY_ID_COLUMN: TABLE_CITIES_I}
+
+(FILTER_SUBSTRING,
+ FILTER_FULL_TEXT) = range(2)
+FULL_TEXT_MIN_LENGTH = 3
+
+(COLUMN_TEXT,
+ COLUMN_NUMBER,
+ COLUMN_DATE) = range(3)
+(PREDICATE_SUBSTRING,
+ PREDICATE_EXACT,
+ PREDICATE_RANGE) = range(3)
+RANGE_SEPARATOR = '..'
 
 (DATA_CORRECT,
  DATA_FORMAT_ERROR,
  DATA_UNIQUE_ERROR,
  DATA_ID_ERROR,
- OPERATION_ERROR) = range(5)
+ OPERATION_ERROR,
+ OPERATION_CANCELLED) = range(6)
 ERROR_MESSAGES = {
     DATA_CORRECT: 'Файл успешно сохранён',
     DATA_FORMAT_ERROR: 'Неверный формат данных',
     DATA_UNIQUE_ERROR: 'Код повторяется',
     DATA_ID_ERROR: 'Код отсутствует в связанной таблице',
-    OPERATION_ERROR: 'Ошибка: '
+    OPERATION_ERROR: 'Ошибка: ',
+    OPERATION_CANCELLED: 'Операция отменена'
 }
 
 WINDOW_TITLE = 'Учёт телефонных переговоров - '
 NO_NAME = 'Без имени.db'
+ICON_FILE = 'icon.ico'
+ROWS_COUNT_MESSAGE = 'Загружено строк: {} из {}'
+LOADING_MESSAGE = 'Загрузка данных...'
+SAVING_MESSAGE = 'Сохранение...'
+CANCEL_TEXT = 'Отмена'
+SEARCH_HINT = 'Текст - поиск подстроки; =значение - точное совпадение;\n' \
+    '>n, >=n, <n, <=n, a..b - числа и даты (дд.мм.гггг)'
+BILLING_MESSAGE = 'Расчёт стоимости...'
+ANALYTICS_MESSAGE = 'Сводка...'
+UPGRADE_MESSAGE = 'Обновление формата файла...'
+SAVE_FIRST_MESSAGE = 'Сначала сохраните файл'
+UNSAVED_CHANGES_MESSAGE = 'Несохранённые изменения не учтены'
+CONFLICT_MESSAGE = 'Другой пользователь изменил записи, изменённые и здесь ({}).\n' \
+    'Сохранить поверх его изменений?'
+CONFLICT_KEYS = '{}: {}'
+MAX_CONFLICT_KEYS = 10
+READ_ONLY_CAPTION = ' (только чтение)'
+CLI_SPLIT_LINE = '{}: перенесено строк {} в {}'
+JOURNAL_RESTORED_MESSAGE = 'Восстановлены несохранённые изменения: {}'
+FILE_CHANGED_MESSAGE = 'Файл изменён другим пользователем; откройте его заново, чтобы увидеть изменения'
+IMPORT_MESSAGE = 'Импорт...'
+EXPORT_MESSAGE = 'Экспорт...'
+IMPORT_RESULT_MESSAGE = 'Импортировано строк: {}, отклонено: {}'
+REJECTED_REPORT_MESSAGE = 'Отклонённые строки: {}'
+EXPORT_RESULT_MESSAGE = 'Экспортировано строк: {}'
+COLUMNS_ERROR_MESSAGE = 'Неверный набор столбцов'
+CLI_VALID_MESSAGE = 'Ошибок нет'
+CLI_ERROR_LINE = '{}, код {}, {} = "{}": {}'
+CLI_COLUMN_ERROR = 'Нет столбца {}; столбцы: {}'
+CLI_DATE_ERROR = 'Неверная дата: {}'
+CLI_MONTH_ERROR = 'Неверный месяц (мм.гггг): {}'
+TRANSFER_FILTER = 'CSV (*.csv);;JSON Lines (*.jsonl)'
+PROFILE_EMPTY_MESSAGE = 'Нет данных профилирования'
+STARTUP_REPORT_LINE = '{}: {:.1f} мс'
+PROFILE_REPORT_LINE = '{}: вызовов {}, всего {:.1f} мс, максимум {:.1f} мс, строк {}'
+
+FETCH_PAGE_SIZE = 1000
+LOAD_BATCH_SIZE = 500
+SAVE_BATCH_SIZE = 10000
+TRANSFER_CHUNK_SIZE = 5000
+MAX_PENDING_BATCHES = 2
+# SQLite steps between checks for cancellation of a long query.
+PROGRESS_STEPS = 100000
+SEARCH_DELAY = 250
+# How often the window looks for commits of other processes to its file, ms.
+WATCH_INTERVAL = 1000
+# Entries of row_changes kept after a save; a window that has not seen the
+# older ones reopens the file.
+CHANGE_LOG_SIZE = 100000
+
+# The journal of unsaved edits is a sidecar of the file; it is synced to
+# disk this often, ms, or after this many records.
+JOURNAL_SUFFIX = '-edits-{}'
+JOURNAL_SYNC_INTERVAL = 1000
+JOURNAL_SYNC_RECORDS = 1000
+(JOURNAL_BASE,
+ JOURNAL_SET,
+ JOURNAL_ADD,
+ JOURNAL_DELETE) = ('base', 'set', 'add', 'delete')
+
+PROFILE_ENVIRONMENT = 'PRACTICE_PROFILE'
+PROFILE_SLOW_ENVIRONMENT = 'PRACTICE_PROFILE_SLOW_MS'
+STARTUP_ENVIRONMENT = 'PRACTICE_STARTUP_REPORT'
+SLOW_OPERATION_TIME = 0.05
+MAX_TRACE_EVENTS = 100000
 
 HEADERS = (
     ('Код абонента', 'Номер телефона', 'ИНН', 'Адрес'),
@@ -32,17 +110,259 @@ HEADERS = (
     ('Код переговоров', 'Код абонента', 'Код города', 'Дата', 'Количество минут', 'Время суток')
 )
 
+BILLING_HEADERS = (
+    ('Код абонента', 'Номер телефона', 'Количество звонков', 'Количество минут', 'Стоимость'),
+    ('Код города', 'Название', 'Количество звонков', 'Количество минут', 'Выручка')
+)
+
+ANALYTICS_HEADERS = (
+    ('Код абонента', 'Номер телефона', 'Количество звонков', 'Минут днём', 'Минут ночью', 'Всего минут'),
+    ('Месяц', 'Код города', 'Название', 'Количество звонков', 'Минут днём', 'Минут ночью', 'Всего минут'),
+    ('Месяц', 'Количество звонков', 'Минут днём', 'Минут ночью', 'Всего минут')
+)
+DEFAULT_TOP_CALLERS = 20
+
+COLUMN_TYPES = (
+    (COLUMN_NUMBER, COLUMN_NUMBER, COLUMN_TEXT, COLUMN_TEXT),
+    (COLUMN_NUMBER, COLUMN_TEXT, COLUMN_NUMBER, COLUMN_NUMBER),
+    (COLUMN_NUMBER, COLUMN_NUMBER, COLUMN_NUMBER, COLUMN_DATE, COLUMN_NUMBER, COLUMN_TEXT)
+)
+
+(STORE_NUMBER,
+ STORE_DIGITS,
+ STORE_DATE,
+ STORE_CATEGORY) = range(4)
+
+# How the cells of every column are kept in memory: numbers in integer
+# arrays, digit strings that may start with zeros as numbers as well, dates
+# as ordinals and texts that repeat as codes of their distinct values.
+COLUMN_STORAGE = (
+    (STORE_NUMBER, STORE_NUMBER, STORE_DIGITS, STORE_CATEGORY),
+    (STORE_NUMBER, STORE_CATEGORY, STORE_NUMBER, STORE_NUMBER),
+    (STORE_NUMBER, STORE_NUMBER, STORE_NUMBER, STORE_DATE, STORE_NUMBER, STORE_CATEGORY)
+)
+
+REPORT_HEADERS = ('Строка', 'Ошибка')
+
 DEFAULT_TABLE_VALUES = (
     ['1', '89000000000', '000000000000', 'Введите адрес'],
     ['1', 'Введите город', '0', '0'],
     ['1', '1', '1', '01.01.0001', '0', 'день']
 )
 
+DATE_CHECK = 'DATE_CHECK'
+
 TABLE_REG_EXPRESSIONS = (
-    tuple(QRegExp(reg_exp) for reg_exp in ('[0-9]{1,}', '8[0-9]{10}', '[0-9]{12}', '.{3,}')),
-    tuple(QRegExp(reg_exp) for reg_exp in ('[0-9]{1,}', '.{3,}', '[0-9]{1,}', '[0-9]{1,}')),
-    tuple(QRegExp(reg_exp) if reg_exp != 'DATE_CHECK' else DateCheck() for reg_exp in (
-        '[0-9]{1,}', '[0-9]{1,}', '[0-9]{1,}', 'DATE_CHECK', '[0-9]{1,}', '(день|ночь)'))
+    ('[0-9]{1,}', '8[0-9]{10}', '[0-9]{12}', '.{3,}'),
+    ('[0-9]{1,}', '.{3,}', '[0-9]{1,}', '[0-9]{1,}'),
+    ('[0-9]{1,}', '[0-9]{1,}', '[0-9]{1,}', DATE_CHECK, '[0-9]{1,}', '(день|ночь)')
+)
+
+DB_TABLE_NAMES = ('callers', 'cities', 'conversations')
+
+DB_COLUMN_NAMES = (
+    ('caller_id', 'phone_number', 'tin', 'address'),
+    ('city_id', 'name', 'day_rate', 'night_rate'),
+    ('conversation_id', 'caller_id', 'city_id', 'date', 'minute_number', 'time')
+)
+
+DB_FILTER_KINDS = (
+    (FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_FULL_TEXT),
+    (FILTER_SUBSTRING, FILTER_FULL_TEXT, FILTER_SUBSTRING, FILTER_SUBSTRING),
+    (FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_SUBSTRING, FILTER_SUBSTRING)
+)
+
+# The version of the file format, kept in PRAGMA user_version. Files of the
+# first version have 0 there and are upgraded by DB_MIGRATIONS when opened.
+SCHEMA_VERSION = 6
+
+# Dates are stored as yyyy-mm-dd, so that they compare and index in date
+# order, and are shown as dd.mm.yyyy. Text that is not a date is stored as is.
+DB_ISO_DATE = "CASE WHEN {0} GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]' " \
+    "THEN substr({0}, 7, 4) || '-' || substr({0}, 4, 2) || '-' || substr({0}, 1, 2) ELSE {0} END"
+DB_DATE_TEXT = "CASE WHEN date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' " \
+    "THEN substr(date, 9, 2) || '.' || substr(date, 6, 2) || '.' || substr(date, 1, 4) ELSE date END"
+DB_CONVERSATION_COLUMNS = f'conversation_id, caller_id, city_id, {DB_DATE_TEXT} AS date, minute_number, time'
+DB_SELECT_COLUMNS = ('*', '*', DB_CONVERSATION_COLUMNS)
+DB_COLUMN_EXPRESSIONS = (
+    ('caller_id', 'phone_number', 'tin', 'address'),
+    ('city_id', 'name', 'day_rate', 'night_rate'),
+    ('conversation_id', 'caller_id', 'city_id', DB_DATE_TEXT, 'minute_number', 'time')
+)
+
+# Foreign keys are checked on commit, so a save can delete and renumber rows
+# in any order within its transaction.
+DB_CREATE_CONVERSATIONS_REQUEST = '''CREATE TABLE IF NOT EXISTS {} (
+            conversation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            caller_id INTEGER NOT NULL REFERENCES callers (caller_id) DEFERRABLE INITIALLY DEFERRED,
+            city_id INTEGER NOT NULL REFERENCES cities (city_id) DEFERRABLE INITIALLY DEFERRED,
+            date TEXT NOT NULL,
+            minute_number INTEGER NOT NULL,
+            time TEXT NOT NULL
+        )'''
+
+DB_CONVERSATION_INDEX_REQUESTS = (
+    'CREATE INDEX IF NOT EXISTS conversations_caller_id ON conversations (caller_id)',
+    'CREATE INDEX IF NOT EXISTS conversations_city_id ON conversations (city_id)',
+    'CREATE INDEX IF NOT EXISTS conversations_date ON conversations (date)'
+)
+
+# Rollups of conversations for the analytics: totals per caller and per city
+# and month, split into day and night minutes. Triggers keep them up to date
+# with every insert, update and delete, so they are never recomputed.
+DB_ROLLUP_TABLE_REQUESTS = (
+    '''CREATE TABLE IF NOT EXISTS caller_totals (
+            caller_id INTEGER PRIMARY KEY,
+            calls INTEGER NOT NULL,
+            day_minutes INTEGER NOT NULL,
+            night_minutes INTEGER NOT NULL
+        )''',
+    'CREATE INDEX IF NOT EXISTS caller_totals_minutes ON caller_totals (day_minutes + night_minutes)',
+    '''CREATE TABLE IF NOT EXISTS city_months (
+            city_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            day_minutes INTEGER NOT NULL,
+            night_minutes INTEGER NOT NULL,
+            PRIMARY KEY (city_id, month)
+        ) WITHOUT ROWID'''
+)
+
+DB_DAY_MINUTES = "CASE {0}.time WHEN 'ночь' THEN 0 ELSE {0}.minute_number END"
+DB_NIGHT_MINUTES = "CASE {0}.time WHEN 'ночь' THEN {0}.minute_number ELSE 0 END"
+DB_MONTH = 'substr({0}.date, 1, 7)'
+
+DB_ROLLUP_FILL_REQUESTS = (
+    f'''INSERT INTO caller_totals
+        SELECT caller_id, COUNT(*), SUM({DB_DAY_MINUTES.format('conversations')}),
+            SUM({DB_NIGHT_MINUTES.format('conversations')})
+        FROM conversations
+        GROUP BY caller_id''',
+    f'''INSERT INTO city_months
+        SELECT city_id, {DB_MONTH.format('conversations')}, COUNT(*), SUM({DB_DAY_MINUTES.format('conversations')}),
+            SUM({DB_NIGHT_MINUTES.format('conversations')})
+        FROM conversations
+        GROUP BY city_id, {DB_MONTH.format('conversations')}'''
+)
+
+DB_ROLLUP_ADD = '''
+            INSERT INTO caller_totals VALUES ({row}.caller_id, 1, {day}, {night})
+                ON CONFLICT (caller_id) DO UPDATE SET calls = calls + 1,
+                    day_minutes = day_minutes + excluded.day_minutes,
+                    night_minutes = night_minutes + excluded.night_minutes;
+            INSERT INTO city_months VALUES ({row}.city_id, {month}, 1, {day}, {night})
+                ON CONFLICT (city_id, month) DO UPDATE SET calls = calls + 1,
+                    day_minutes = day_minutes + excluded.day_minutes,
+                    night_minutes = night_minutes + excluded.night_minutes;'''.format(
+    row='new', day=DB_DAY_MINUTES.format('new'), night=DB_NIGHT_MINUTES.format('new'), month=DB_MONTH.format('new'))
+DB_ROLLUP_REMOVE = '''
+            UPDATE caller_totals SET calls = calls - 1, day_minutes = day_minutes - {day},
+                night_minutes = night_minutes - {night}
+                WHERE caller_id = {row}.caller_id;
+            DELETE FROM caller_totals WHERE caller_id = {row}.caller_id AND calls = 0;
+            UPDATE city_months SET calls = calls - 1, day_minutes = day_minutes - {day},
+                night_minutes = night_minutes - {night}
+                WHERE city_id = {row}.city_id AND month = {month};
+            DELETE FROM city_months WHERE city_id = {row}.city_id AND month = {month} AND calls = 0;'''.format(
+    row='old', day=DB_DAY_MINUTES.format('old'), night=DB_NIGHT_MINUTES.format('old'), month=DB_MONTH.format('old'))
+
+DB_ROLLUP_TRIGGER_REQUESTS = (
+    f'''CREATE TRIGGER IF NOT EXISTS conversations_rollup_insert AFTER INSERT ON conversations BEGIN{DB_ROLLUP_ADD}
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS conversations_rollup_delete AFTER DELETE ON conversations BEGIN{DB_ROLLUP_REMOVE}
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS conversations_rollup_update
+        AFTER UPDATE OF caller_id, city_id, date, minute_number, time ON conversations
+        WHEN old.caller_id IS NOT new.caller_id OR old.city_id IS NOT new.city_id OR old.date IS NOT new.date
+            OR old.minute_number IS NOT new.minute_number OR old.time IS NOT new.time
+        BEGIN{DB_ROLLUP_REMOVE}{DB_ROLLUP_ADD}
+        END'''
+)
+
+# A bulk load drops the triggers and fills the rollups in one pass afterwards.
+DB_ROLLUP_DROP_TRIGGER_REQUESTS = (
+    'DROP TRIGGER IF EXISTS conversations_rollup_insert',
+    'DROP TRIGGER IF EXISTS conversations_rollup_delete',
+    'DROP TRIGGER IF EXISTS conversations_rollup_update'
+)
+
+# Every insert, update and delete of a row is logged in row_changes with the
+# key it had and had before. The sequence number of the last entry of a row
+# is its version: another window that has seen the log up to some entry
+# knows which of its rows are out of date and which of its own edits would
+# overwrite someone else's.
+DB_CHANGE_TABLE_REQUEST = '''CREATE TABLE IF NOT EXISTS row_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_id INTEGER NOT NULL,
+            row_id INTEGER NOT NULL
+        )'''
+
+DB_CHANGE_TRIGGER_REQUESTS = tuple(
+    request.format(table=table, key=columns[0], index=index)
+    for index, (table, columns) in enumerate(zip(DB_TABLE_NAMES, DB_COLUMN_NAMES))
+    for request in (
+        '''CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO row_changes (table_id, row_id) VALUES ({index}, new.{key});
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO row_changes (table_id, row_id) VALUES ({index}, old.{key});
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN
+            INSERT INTO row_changes (table_id, row_id) VALUES ({index}, old.{key});
+            INSERT INTO row_changes (table_id, row_id) SELECT {index}, new.{key} WHERE new.{key} IS NOT old.{key};
+        END'''
+    )
+)
+
+DB_CHANGE_DROP_TRIGGER_REQUESTS = tuple(f'DROP TRIGGER IF EXISTS {table}_changes_{event}'
+                                        for table in DB_TABLE_NAMES for event in ('insert', 'delete', 'update'))
+
+# Conversations of past years or months can be moved into files of their
+# own, partitions, by `python -m cli split`; the file keeps the current
+# period and a list of its partitions. A partition has the conversations of
+# its period and nothing else, so it has no foreign keys and no triggers.
+PARTITION_PERIODS = {'year': 4, 'month': 7}
+PARTITION_FILE = '{}.{}.db'
+PARTITION_SCHEMA = 'p{}'
+BASE_SCHEMA = 'base'
+PARTITION_VIEW = 'all_conversations'
+# Partitions attached at a time, below SQLite's limit of 10 databases.
+MAX_ATTACHED_PARTITIONS = 8
+
+DB_PARTITIONS_TABLE_REQUEST = '''CREATE TABLE IF NOT EXISTS partitions (
+            name TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            first_date TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            max_id INTEGER
+        )'''
+# The callers and cities that conversations in partitions refer to: the
+# foreign keys of those conversations are not checked by SQLite.
+DB_PARTITION_REFERENCES_TABLE_REQUEST = '''CREATE TABLE IF NOT EXISTS partition_references (
+            table_id INTEGER NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (table_id, row_id)
+        ) WITHOUT ROWID'''
+
+DB_PARTITION_CREATE_REQUESTS = (
+    '''CREATE TABLE IF NOT EXISTS {0}.conversations (
+            conversation_id INTEGER PRIMARY KEY,
+            caller_id INTEGER NOT NULL,
+            city_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            minute_number INTEGER NOT NULL,
+            time TEXT NOT NULL
+        )''',
+    'CREATE INDEX IF NOT EXISTS {0}.conversations_caller_id ON conversations (caller_id)',
+    'CREATE INDEX IF NOT EXISTS {0}.conversations_city_id ON conversations (city_id)',
+    'CREATE INDEX IF NOT EXISTS {0}.conversations_date ON conversations (date)',
+    '''CREATE TABLE IF NOT EXISTS {0}.partition_info (
+            main TEXT NOT NULL,
+            name TEXT NOT NULL
+        )''',
+    'DELETE FROM {0}.partition_info',
+    'INSERT INTO {0}.partition_info VALUES (?, ?)'
 )
 
 DB_CREATE_REQUESTS = (
@@ -58,18 +378,80 @@ DB_CREATE_REQUESTS = (
             day_rate INTEGER NOT NULL,
             night_rate INTEGER NOT NULL
         )''',
-    '''CREATE TABLE IF NOT EXISTS conversations (
-            conversation_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            caller_id INTEGER NOT NULL,
-            city_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            minute_number INTEGER NOT NULL,
-            time TEXT NOT NULL,
-            FOREIGN KEY (caller_id) REFERENCES callers(caller_id),
-            FOREIGN KEY (city_id) REFERENCES callers(city_id)
-        )''',
+    DB_CREATE_CONVERSATIONS_REQUEST.format('conversations'),
+    *DB_CONVERSATION_INDEX_REQUESTS,
+    *DB_ROLLUP_TABLE_REQUESTS,
+    *DB_ROLLUP_TRIGGER_REQUESTS,
+    DB_CHANGE_TABLE_REQUEST,
+    *DB_CHANGE_TRIGGER_REQUESTS,
+    DB_PARTITIONS_TABLE_REQUEST,
+    DB_PARTITION_REFERENCES_TABLE_REQUEST
 )
 
+# (version, requests): the requests upgrade a file of an older version.
+DB_MIGRATIONS = (
+    (2, (
+        # Version 1 had no indexes, a foreign key to callers(city_id) and
+        # dd.mm.yyyy dates; conversations is rebuilt with the new definition.
+        DB_CREATE_CONVERSATIONS_REQUEST.format('conversations_new'),
+        f'''INSERT INTO conversations_new
+            SELECT conversation_id, caller_id, city_id, {DB_ISO_DATE.format('date')}, minute_number, time
+            FROM conversations''',
+        'DROP TABLE conversations',
+        'ALTER TABLE conversations_new RENAME TO conversations',
+        *DB_CONVERSATION_INDEX_REQUESTS
+    )),
+    (3, (
+        *DB_ROLLUP_TABLE_REQUESTS,
+        *DB_ROLLUP_FILL_REQUESTS,
+        *DB_ROLLUP_TRIGGER_REQUESTS
+    )),
+    (4, (
+        DB_CHANGE_TABLE_REQUEST,
+        *DB_CHANGE_TRIGGER_REQUESTS
+    )),
+    (5, (
+        DB_PARTITIONS_TABLE_REQUEST,
+    )),
+    (6, (
+        DB_PARTITION_REFERENCES_TABLE_REQUEST,
+    )),
+)
+
+DB_CONNECTION_PRAGMAS = ('PRAGMA foreign_keys = ON',)
+DB_VERSION_REQUEST = f'PRAGMA user_version = {SCHEMA_VERSION}'
+DB_DATA_VERSION_REQUEST = 'PRAGMA data_version'
+DB_LAST_CHANGE_REQUEST = 'SELECT COALESCE(MAX(seq), 0) FROM row_changes'
+DB_CHANGES_SINCE_REQUEST = 'SELECT seq, table_id, row_id FROM row_changes WHERE seq > ? ORDER BY seq'
+DB_PRUNE_CHANGES_REQUEST = 'DELETE FROM row_changes WHERE seq <= ?'
+# An entry of this table index tells that any row may have changed.
+CHANGES_RESET = -1
+DB_RESET_CHANGES_REQUESTS = (
+    'DELETE FROM row_changes',
+    f'INSERT INTO row_changes (table_id, row_id) VALUES ({CHANGES_RESET}, 0)'
+)
+
+DB_PARTITIONS_REQUEST = '''SELECT name, filename, first_date, last_date FROM partitions
+    WHERE last_date >= ? AND first_date <= ?
+    ORDER BY first_date'''
+DB_PARTITION_MAX_ID_REQUEST = 'SELECT MAX(max_id) FROM partitions'
+DB_PARTITION_REFERENCES_REQUEST = 'SELECT row_id FROM partition_references WHERE table_id = ?'
+DB_SAVE_PARTITION_REFERENCES_REQUESTS = tuple(
+    f'INSERT OR IGNORE INTO partition_references SELECT DISTINCT {index}, {DB_COLUMN_NAMES[TABLE_CONVERSATIONS_I][col]} '
+    'FROM {}.conversations'
+    for col, index in FOREIGN_KEYS.items())
+DB_PARTITION_INFO_REQUEST = 'SELECT main, name FROM partition_info'
+DB_PERIODS_REQUEST = '''SELECT DISTINCT substr(date, 1, ?) FROM conversations
+    WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    ORDER BY 1'''
+DB_SPLIT_COPY_REQUEST = 'INSERT OR IGNORE INTO {}.conversations SELECT * FROM main.conversations WHERE date BETWEEN ? AND ?'
+DB_SPLIT_DELETE_REQUEST = 'DELETE FROM main.conversations WHERE date BETWEEN ? AND ?'
+DB_PARTITION_STATS_REQUEST = 'SELECT COUNT(*), MIN(date), MAX(date), MAX(conversation_id) FROM {}.conversations'
+DB_SAVE_PARTITION_REQUEST = '''INSERT INTO partitions VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET filename = excluded.filename, first_date = excluded.first_date,
+        last_date = excluded.last_date, rows = excluded.rows, max_id = excluded.max_id'''
+DB_WAL_REQUEST = 'PRAGMA journal_mode = WAL'
+
 DB_DELETE_REQUESTS = (
     'DELETE FROM callers',
     'DELETE FROM cities',
@@ -83,7 +465,170 @@ DB_INSERT_REQUESTS = (
     '''INSERT INTO cities
         (city_id, name, day_rate, night_rate)
         VALUES (?, ?, ?, ?)''',
-    '''INSERT INTO conversations
+    f'''INSERT INTO conversations
         (conversation_id, caller_id, city_id, date, minute_number, time)
-        VALUES (?, ?, ?, ?, ?, ?)'''
+        VALUES (?1, ?2, ?3, {DB_ISO_DATE.format('?4')}, ?5, ?6)'''
+)
+
+DB_UPDATE_REQUESTS = (
+    '''UPDATE callers
+        SET caller_id = ?, phone_number = ?, tin = ?, address = ?
+        WHERE caller_id = ?''',
+    '''UPDATE cities
+        SET city_id = ?, name = ?, day_rate = ?, night_rate = ?
+        WHERE city_id = ?''',
+    f'''UPDATE conversations
+        SET conversation_id = ?1, caller_id = ?2, city_id = ?3, date = {DB_ISO_DATE.format('?4')},
+            minute_number = ?5, time = ?6
+        WHERE conversation_id = ?7'''
+)
+
+DB_UPDATE_ID_REQUESTS = (
+    'UPDATE callers SET caller_id = ? WHERE caller_id = ?',
+    'UPDATE cities SET city_id = ? WHERE city_id = ?',
+    'UPDATE conversations SET conversation_id = ? WHERE conversation_id = ?'
+)
+
+DB_DELETE_ROW_REQUESTS = (
+    'DELETE FROM callers WHERE caller_id = ?',
+    'DELETE FROM cities WHERE city_id = ?',
+    'DELETE FROM conversations WHERE conversation_id = ?'
+)
+
+DB_COUNT_REQUESTS = (
+    'SELECT COUNT(*), MAX(caller_id) FROM callers',
+    'SELECT COUNT(*), MAX(city_id) FROM cities',
+    'SELECT COUNT(*), MAX(conversation_id) FROM conversations'
+)
+
+DB_SELECT_PAGE_REQUESTS = (
+    '''SELECT * FROM callers
+        WHERE caller_id > ?
+        ORDER BY caller_id
+        LIMIT ?''',
+    '''SELECT * FROM cities
+        WHERE city_id > ?
+        ORDER BY city_id
+        LIMIT ?''',
+    f'''SELECT {DB_CONVERSATION_COLUMNS} FROM conversations
+        WHERE conversation_id > ?
+        ORDER BY conversation_id
+        LIMIT ?'''
+)
+
+DB_SELECT_ID_REQUESTS = (
+    'SELECT 1 FROM callers WHERE caller_id = ?',
+    'SELECT 1 FROM cities WHERE city_id = ?',
+    'SELECT 1 FROM conversations WHERE conversation_id = ?'
+)
+
+DB_SELECT_ALL_REQUESTS = (
+    'SELECT * FROM {} ORDER BY caller_id',
+    'SELECT * FROM {} ORDER BY city_id',
+    f'SELECT {DB_CONVERSATION_COLUMNS} FROM {{}} ORDER BY conversation_id'
+)
+
+DB_SELECT_ROWS_REQUESTS = (
+    'SELECT * FROM callers WHERE caller_id IN ({})',
+    'SELECT * FROM cities WHERE city_id IN ({})',
+    f'SELECT {DB_CONVERSATION_COLUMNS} FROM conversations WHERE conversation_id IN ({{}})'
+)
+
+DB_COUNT_AFTER_REQUESTS = (
+    'SELECT COUNT(*), MAX(caller_id) FROM callers WHERE caller_id > ?',
+    'SELECT COUNT(*), MAX(city_id) FROM cities WHERE city_id > ?',
+    'SELECT COUNT(*), MAX(conversation_id) FROM conversations WHERE conversation_id > ?'
+)
+
+DB_SELECT_IDS_REQUESTS = (
+    'SELECT caller_id FROM callers WHERE caller_id IN ({})',
+    'SELECT city_id FROM cities WHERE city_id IN ({})',
+    'SELECT conversation_id FROM conversations WHERE conversation_id IN ({})'
 )
+
+DB_FULL_TEXT_TABLES = ('callers_fts', 'cities_fts', None)
+
+DB_SEARCH_INDEX_REQUESTS = (
+    'CREATE INDEX IF NOT EXISTS callers_phone_number ON callers (phone_number)',
+    'CREATE INDEX IF NOT EXISTS cities_day_rate ON cities (day_rate)',
+    'CREATE INDEX IF NOT EXISTS cities_night_rate ON cities (night_rate)',
+    'CREATE INDEX IF NOT EXISTS conversations_minute_number ON conversations (minute_number)'
+)
+
+DB_FULL_TEXT_CREATE_REQUESTS = (
+    ('''CREATE VIRTUAL TABLE callers_fts USING fts5(
+            address, content='callers', content_rowid='caller_id', tokenize='trigram'
+        )''',
+     '''CREATE TRIGGER callers_fts_insert AFTER INSERT ON callers BEGIN
+            INSERT INTO callers_fts (rowid, address) VALUES (new.caller_id, new.address);
+        END''',
+     '''CREATE TRIGGER callers_fts_delete AFTER DELETE ON callers BEGIN
+            INSERT INTO callers_fts (callers_fts, rowid, address) VALUES ('delete', old.caller_id, old.address);
+        END''',
+     '''CREATE TRIGGER callers_fts_update AFTER UPDATE ON callers BEGIN
+            INSERT INTO callers_fts (callers_fts, rowid, address) VALUES ('delete', old.caller_id, old.address);
+            INSERT INTO callers_fts (rowid, address) VALUES (new.caller_id, new.address);
+        END''',
+     "INSERT INTO callers_fts (callers_fts) VALUES ('rebuild')"),
+    ('''CREATE VIRTUAL TABLE cities_fts USING fts5(
+            name, content='cities', content_rowid='city_id', tokenize='trigram'
+        )''',
+     '''CREATE TRIGGER cities_fts_insert AFTER INSERT ON cities BEGIN
+            INSERT INTO cities_fts (rowid, name) VALUES (new.city_id, new.name);
+        END''',
+     '''CREATE TRIGGER cities_fts_delete AFTER DELETE ON cities BEGIN
+            INSERT INTO cities_fts (cities_fts, rowid, name) VALUES ('delete', old.city_id, old.name);
+        END''',
+     '''CREATE TRIGGER cities_fts_update AFTER UPDATE ON cities BEGIN
+            INSERT INTO cities_fts (cities_fts, rowid, name) VALUES ('delete', old.city_id, old.name);
+            INSERT INTO cities_fts (rowid, name) VALUES (new.city_id, new.name);
+        END''',
+     "INSERT INTO cities_fts (cities_fts) VALUES ('rebuild')"),
+    ()
+)
+
+# The requests below take the conversations to read: the table, with ' NOT
+# INDEXED' after it for a wide date range, where a plain scan is much faster
+# than going through an index, or the view of the table and its partitions.
+DB_DATE_SPAN_REQUEST = 'SELECT MIN(date), MAX(date) FROM main.conversations'
+DB_CALL_COST = "minute_number * CASE time WHEN 'ночь' THEN night_rate ELSE day_rate END"
+
+DB_CALL_COSTS_REQUEST = f'''SELECT {DB_CONVERSATION_COLUMNS}, {DB_CALL_COST}
+    FROM {{}} JOIN cities USING (city_id)
+    WHERE conversations.date BETWEEN ? AND ?
+    ORDER BY conversation_id'''
+
+DB_BILLING_REQUESTS = (
+    f'''SELECT caller_id, phone_number, calls, minutes, cost FROM (
+            SELECT caller_id, COUNT(*) AS calls, SUM(minute_number) AS minutes, SUM({DB_CALL_COST}) AS cost
+            FROM {{}} JOIN cities USING (city_id)
+            WHERE date BETWEEN ? AND ?
+            GROUP BY caller_id
+        ) LEFT JOIN callers USING (caller_id)
+        ORDER BY caller_id''',
+    f'''SELECT city_id, name, COUNT(*), SUM(minute_number), SUM({DB_CALL_COST})
+        FROM {{}} JOIN cities USING (city_id)
+        WHERE date BETWEEN ? AND ?
+        GROUP BY city_id
+        ORDER BY city_id'''
+)
+
+# Analytics read the rollups only; months are yyyy-mm there and mm.yyyy on
+# screen.
+DB_MONTH_TEXT = "substr(month, 6, 2) || '.' || substr(month, 1, 4)"
+DB_TOP_CALLERS_REQUEST = '''SELECT caller_id, phone_number, calls, day_minutes, night_minutes,
+        day_minutes + night_minutes
+    FROM caller_totals LEFT JOIN callers USING (caller_id)
+    ORDER BY day_minutes + night_minutes DESC
+    LIMIT ?'''
+DB_CITY_MONTHS_REQUEST = f'''SELECT {DB_MONTH_TEXT}, city_id, name, calls, day_minutes, night_minutes,
+        day_minutes + night_minutes
+    FROM city_months LEFT JOIN cities USING (city_id)
+    WHERE month BETWEEN ? AND ?
+    ORDER BY month, city_id'''
+DB_DAY_NIGHT_REQUEST = f'''SELECT {DB_MONTH_TEXT}, SUM(calls), SUM(day_minutes), SUM(night_minutes),
+        SUM(day_minutes + night_minutes)
+    FROM city_months
+    WHERE month BETWEEN ? AND ?
+    GROUP BY month
+    ORDER BY month'''
@@ -0,0 +1,307 @@
+from array import array
+from bisect import bisect_left
+from columns import make_column, put, put_all, TYPECODES
+from consts import HEADERS, DEFAULT_TABLE_VALUES, ID_COLUMN, COLUMN_STORAGE
+
+# IDs read from the file are looked up by their text, which has at most this
+# many digits.
+MAX_ID_LENGTH = 18
+# States of a slot: deleted, a row, a row that has the ID it was read from
+# the file with.
+(ROW_DELETED,
+ ROW_ALIVE,
+ ROW_LOADED) = range(3)
+
+
+class DataTable:
+    # Rows live in stable slots: a deleted row is only marked in `state`, so
+    # a slot number keeps pointing at the same row while the table and the
+    # search results are edited. The cells are kept by column (columns.py),
+    # a few bytes per cell. `order` is the list of slots in display order;
+    # slots are only ever appended, so it is ascending and the row of a slot
+    # is found by bisection (see position()). `max_id` is the largest
+    # numeric ID the table has had, so a new row gets the next one without
+    # scanning the table.
+    # `keys` holds the primary key each slot has in the opened file, so a
+    # save only has to write the rows that changed; rows in `inserted` have
+    # none yet and get negative keys, -1, -2, ..., to be referred to by.
+    # The IDs rows were loaded with are found by bisection in `loaded_ids`
+    # (ascending, as the file is read in key order) while the row still has
+    # that ID, which its state, ROW_LOADED, tells; other IDs, of added rows
+    # and edited cells, are in `id_slots`, which maps an ID text to its
+    # slot (or to a set of slots while the ID is repeated).
+    # Keys that are not the ones rows were loaded with, of saved, reread and
+    # added rows, are mapped to their slots by `key_slots`.
+    # `invalid` maps cells that failed validation to their error status;
+    # `conflicts` holds keys of edited rows that someone else has changed
+    # in the file since.
+    def __init__(self, index):
+        self.index = index
+        self.headers = HEADERS[index]
+        self.source = None
+        self.invalid = {}
+        self.inserted = set()
+        self.updated = set()
+        self.deleted = set()
+        self.conflicts = set()
+        self.clear()
+
+    def clear(self):
+        self.columns = [make_column(storage) for storage in COLUMN_STORAGE[self.index]]
+        self.state = bytearray()
+        self.order = array('i')
+        self.keys = array(TYPECODES[0])
+        self.loaded_ids = array(TYPECODES[0])
+        self.loaded_slots = array('i')
+        self.id_slots = {}
+        self.key_slots = {}
+        self.max_id = 0
+        self.new_key = 0
+
+    def column_count(self):
+        return len(self.headers)
+
+    def row_count(self):
+        return len(self.order)
+
+    def slot_count(self):
+        return len(self.state)
+
+    def slot(self, row):
+        return self.order[row]
+
+    def value(self, slot, col):
+        return self.columns[col].get(slot)
+
+    def row_data(self, slot):
+        return tuple(column.get(slot) for column in self.columns)
+
+    def loaded_id(self, slot):
+        # The ID text the slot was read from the file with, None for rows
+        # added since.
+        i = position(self.loaded_slots, slot)
+        return str(self.loaded_ids[i]) if i != -1 else None
+
+    def loaded_slot(self, text):
+        # The slot read from the file with ID `text`, if it still has it.
+        if not (text.isdigit() and text.isascii()) or len(text) > MAX_ID_LENGTH or \
+                (text[0] == '0' and len(text) > 1):
+            return None
+        item_id = int(text)
+        i = bisect_left(self.loaded_ids, item_id)
+        if i == len(self.loaded_ids) or self.loaded_ids[i] != item_id:
+            return None
+        slot = self.loaded_slots[i]
+        return slot if self.state[slot] == ROW_LOADED else None
+
+    def key_slot(self, key):
+        # The slot of the row that has primary key `key` in the file.
+        i = bisect_left(self.loaded_ids, key)
+        slots = (self.key_slots.get(key),
+                 self.loaded_slots[i] if i < len(self.loaded_ids) and self.loaded_ids[i] == key else None)
+        for slot in slots:
+            if slot is not None and self.state[slot] != ROW_DELETED and self.keys[slot] == key:
+                return slot
+        return None
+
+    def is_edited(self, slot):
+        return slot in self.updated or slot in self.inserted
+
+    def pending_keys(self):
+        # Keys of the rows the next save updates or deletes.
+        return {self.keys[slot] for slot in self.updated} | self.deleted
+
+    def id_count(self, text):
+        slots = self.id_slots.get(text)
+        count = 0 if slots is None else 1 if isinstance(slots, int) else len(slots)
+        return count + (self.loaded_slot(text) is not None)
+
+    def slot_id_count(self, slot):
+        # id_count() of the ID of `slot`, without a search for rows that
+        # have the ID they were loaded with.
+        text = self.value(slot, ID_COLUMN)
+        if self.state[slot] != ROW_LOADED:
+            return self.id_count(text)
+        slots = self.id_slots.get(text)
+        return 1 + (0 if slots is None else 1 if isinstance(slots, int) else len(slots))
+
+    def has_id(self, text):
+        return text in self.id_slots or self.loaded_slot(text) is not None
+
+    def slots_with_id(self, text):
+        slots = self.id_slots.get(text)
+        slots = () if slots is None else (slots,) if isinstance(slots, int) else tuple(slots)
+        slot = self.loaded_slot(text)
+        return slots if slot is None else (slot, *slots)
+
+    def add_id(self, text, slot):
+        if text.isascii() and text.isdigit() and int(text) > self.max_id:
+            self.max_id = int(text)
+        if self.loaded_id(slot) == text:
+            self.state[slot] = ROW_LOADED
+            return
+        slots = self.id_slots.get(text)
+        if slots is None:
+            self.id_slots[text] = slot
+        elif isinstance(slots, int):
+            self.id_slots[text] = {slots, slot}
+        else:
+            slots.add(slot)
+
+    def remove_id(self, text, slot):
+        if self.state[slot] == ROW_LOADED:
+            self.state[slot] = ROW_ALIVE
+            return
+        slots = self.id_slots[text]
+        if isinstance(slots, int):
+            del self.id_slots[text]
+        else:
+            slots.discard(slot)
+            if len(slots) == 1:
+                self.id_slots[text] = slots.pop()
+
+    def set_value(self, slot, col, text, record=True):
+        # `record` is false for values reread from the file, which need no
+        # saving.
+        if col == ID_COLUMN:
+            self.remove_id(self.value(slot, col), slot)
+        self.columns[col].set(slot, text)
+        if col == ID_COLUMN:
+            self.add_id(text, slot)
+        if record and slot not in self.inserted:
+            self.updated.add(slot)
+
+    def total_count(self):
+        if self.source is None:
+            return self.row_count()
+        return self.row_count() + self.source.remaining()
+
+    def load(self, data, source=None):
+        self.clear()
+        self.extend(data)
+        self.invalid.clear()
+        self.inserted.clear()
+        self.updated.clear()
+        self.deleted.clear()
+        self.conflicts.clear()
+        self.source = source
+
+    def extend(self, data):
+        start = len(self.state)
+        slots = range(start, start + len(data))
+        if not data:
+            return slots
+        for column, items in zip(self.columns, zip(*data)):
+            column.extend(items)
+        self.order.extend(slots)
+        ids = [row[ID_COLUMN] for row in data]
+        self.keys = put_all(self.keys, ids)
+        last_id = self.loaded_ids[-1] if self.loaded_ids else None
+        if (ids[0] >= 0 if last_id is None else last_id < ids[0]) and all(map(int.__lt__, ids, ids[1:])):
+            self.loaded_ids = put_all(self.loaded_ids, ids)
+            self.loaded_slots.extend(slots)
+            self.state.extend(bytes((ROW_LOADED,)) * len(data))
+            self.max_id = max(self.max_id, ids[-1])
+        else:
+            self.state.extend(bytes((ROW_ALIVE,)) * len(data))
+            for slot, key in zip(slots, ids):
+                self.add_id(self.value(slot, ID_COLUMN), slot)
+                self.key_slots[key] = slot
+        return slots
+
+    def can_fetch_more(self):
+        return self.source is not None and not self.source.done and not self.source.busy
+
+    def has_unloaded_id(self, text):
+        return self.source is not None and self.source.has_id(text)
+
+    def has_partition_reference(self, text):
+        return self.source is not None and text in self.source.partition_ids
+
+    def append_row(self, values, key=None):
+        # `key` is given when a journal is replayed.
+        if key is None:
+            key = self.new_key - 1
+        self.new_key = min(self.new_key, key)
+        slot = len(self.state)
+        for column, text in zip(self.columns, values):
+            column.set(slot, text)
+        self.state.append(ROW_ALIVE)
+        self.keys = put(self.keys, slot, key)
+        self.key_slots[key] = slot
+        self.add_id(values[ID_COLUMN], slot)
+        self.order.append(slot)
+        self.inserted.add(slot)
+        return slot
+
+    def remove_slot(self, slot, record=True):
+        del self.order[position(self.order, slot)]
+        self.remove_id(self.value(slot, ID_COLUMN), slot)
+        self.state[slot] = ROW_DELETED
+        if not record:
+            return
+        if slot in self.inserted:
+            self.inserted.discard(slot)
+        else:
+            self.deleted.add(self.keys[slot])
+            self.updated.discard(slot)
+
+    def dead_slots(self):
+        state = self.state
+        slot = state.find(ROW_DELETED)
+        while slot != -1:
+            yield slot
+            slot = state.find(ROW_DELETED, slot + 1)
+
+    def lower_texts(self, col, dead_text):
+        # Lowercased texts of a column by slot, `dead_text` for deleted rows.
+        texts = self.columns[col].lower_texts()
+        for slot in self.dead_slots():
+            texts[slot] = dead_text
+        return texts
+
+    def column_keys(self, col, key, dead_key):
+        # key(text) of a column by slot as an array('q'), `dead_key` for
+        # deleted rows.
+        keys = self.columns[col].keys(key)
+        for slot in self.dead_slots():
+            keys[slot] = dead_key
+        return keys
+
+    def text_keys(self, col, key):
+        # key(text) of a column by slot as a list; deleted rows keep the key
+        # of their last text.
+        return self.columns[col].text_keys(key)
+
+    def default_row(self):
+        values = list(DEFAULT_TABLE_VALUES[self.index])
+        max_id = self.max_id
+        if self.source is not None and self.source.max_id is not None:
+            max_id = max(max_id, self.source.max_id)
+        if max_id:
+            values[ID_COLUMN] = str(max_id + 1)
+        return tuple(values)
+
+    def has_changes(self):
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def changes(self):
+        updated = [(self.keys[slot], self.row_data(slot)) for slot in sorted(self.updated)]
+        inserted = [self.row_data(slot) for slot in sorted(self.inserted)]
+        return sorted(self.deleted), updated, inserted
+
+    def mark_saved(self):
+        for slot in self.inserted | self.updated:
+            key = int(self.value(slot, ID_COLUMN))
+            self.keys = put(self.keys, slot, key)
+            self.key_slots[key] = slot
+        self.inserted.clear()
+        self.updated.clear()
+        self.deleted.clear()
+        self.conflicts.clear()
+
+
+def position(slots, slot):
+    # Index of `slot` in an ascending list of slots, -1 if it is not there.
+    i = bisect_left(slots, slot)
+    return i if i < len(slots) and slots[i] == slot else -1
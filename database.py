@@ -0,0 +1,570 @@
+import os
+import sqlite3
+from datetime import date
+from consts import ID_COLUMN, FETCH_PAGE_SIZE, DB_COUNT_REQUESTS, DB_SELECT_PAGE_REQUESTS, DB_SELECT_ID_REQUESTS, \
+    DB_CREATE_REQUESTS, DB_DELETE_REQUESTS, DB_INSERT_REQUESTS, DB_UPDATE_REQUESTS, DB_UPDATE_ID_REQUESTS, \
+    DB_DELETE_ROW_REQUESTS, DB_TABLE_NAMES, DB_COLUMN_NAMES, DB_FILTER_KINDS, DB_FULL_TEXT_TABLES, \
+    DB_SEARCH_INDEX_REQUESTS, DB_FULL_TEXT_CREATE_REQUESTS, FILTER_SUBSTRING, FULL_TEXT_MIN_LENGTH, \
+    LOAD_BATCH_SIZE, SAVE_BATCH_SIZE, COLUMN_TYPES, COLUMN_DATE, PREDICATE_EXACT, PREDICATE_RANGE, \
+    DB_SELECT_COLUMNS, DB_COLUMN_EXPRESSIONS, SCHEMA_VERSION, DB_MIGRATIONS, DB_CONNECTION_PRAGMAS, DB_VERSION_REQUEST, \
+    DB_WAL_REQUEST, PROGRESS_STEPS, DB_DATA_VERSION_REQUEST, DB_LAST_CHANGE_REQUEST, DB_CHANGES_SINCE_REQUEST, \
+    DB_PRUNE_CHANGES_REQUEST, DB_SELECT_ROWS_REQUESTS, DB_COUNT_AFTER_REQUESTS, CHANGE_LOG_SIZE, CHANGES_RESET, \
+    DB_PARTITION_MAX_ID_REQUEST, DB_PARTITION_INFO_REQUEST, BASE_SCHEMA, TABLE_CONVERSATIONS_I, PARTITION_SCHEMA, \
+    PARTITION_VIEW, MAX_ATTACHED_PARTITIONS, DB_PARTITIONS_REQUEST, DB_DATE_SPAN_REQUEST, FOREIGN_KEYS, \
+    DB_PARTITION_REFERENCES_REQUEST
+from pathlib import Path
+from profiling import instrumented, add_rows
+from filters import parse_filter
+from date_check import ordinal_to_iso
+from data_store import DataTable
+
+MIN_DATE_KEY = '0000-00-00'
+MAX_DATE_KEY = '9999-99-99'
+# The date index is used when the range covers at most this share of the
+# dates of a file.
+DATE_INDEX_SHARE = 0.25
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class ConflictError(Exception):
+    # Rows someone else changed since the window last looked at the file,
+    # which the save would overwrite: a list of (table index, key).
+    def __init__(self, conflicts):
+        super().__init__(conflicts)
+        self.conflicts = conflicts
+
+
+class TableReader:
+    # Reads a table in pages ordered by its primary key. Each page continues
+    # after the last key seen, so no cursor is kept open between pages.
+    def __init__(self, connection, index, page_size=FETCH_PAGE_SIZE):
+        self.connection = connection
+        self.index = index
+        self.page_size = page_size
+        self.total, self.max_id = connection.execute(DB_COUNT_REQUESTS[index]).fetchone()
+        self.fetched = 0
+        self.last_id = -1
+        self.done = self.total == 0
+        self.busy = False
+        # IDs that conversations in partitions refer to (see open_readers()).
+        self.partition_ids = set()
+
+    @instrumented(rows=len)
+    def fetch(self, count=None):
+        if self.done:
+            return []
+        limit = count or self.page_size
+        rows = self.connection.execute(DB_SELECT_PAGE_REQUESTS[self.index], (self.last_id, limit)).fetchall()
+        self.advance(rows, limit)
+        return rows
+
+    def advance(self, rows, limit=None):
+        if rows:
+            self.last_id = rows[-1][ID_COLUMN]
+        self.fetched += len(rows)
+        if (limit is not None and len(rows) < limit) or self.fetched >= self.total:
+            self.done = True
+
+    def fetch_all(self):
+        return self.fetch(max(self.total - self.fetched, 1))
+
+    def remaining(self):
+        return 0 if self.done else self.total - self.fetched
+
+    def is_loaded(self, key):
+        return self.done or key <= self.last_id
+
+    def recount(self):
+        # Other processes added or removed rows that are not fetched yet.
+        count, max_id = self.connection.execute(DB_COUNT_AFTER_REQUESTS[self.index], (self.last_id,)).fetchone()
+        self.total = self.fetched + count
+        if max_id is not None:
+            self.max_id = max(self.max_id or 0, max_id)
+
+    @instrumented()
+    def has_id(self, text):
+        try:
+            item_id = int(text)
+        except ValueError:
+            return False
+        if self.done or item_id <= self.last_id:
+            return False
+        return self.connection.execute(DB_SELECT_ID_REQUESTS[self.index], (item_id,)).fetchone() is not None
+
+
+class QueryReader:
+    # Pages through the rows of a table that match the search filters. The
+    # filters are turned into SQL, so the rows never have to be in memory.
+    # Conversations are read from the partitions of the file too, only from
+    # those the date filter reaches; the rows come in the order of their IDs
+    # within each view table_sources() gives.
+    def __init__(self, connection, index, filters, page_size=FETCH_PAGE_SIZE):
+        self.connection = connection
+        self.index = index
+        self.page_size = page_size
+        self.request, self.params, self.first, self.last = build_filter_request(index, filters)
+        self.source = 0
+        self.last_id = -1
+        self.done = False
+
+    @instrumented(rows=len)
+    def fetch(self, count=None):
+        if self.done:
+            return []
+        limit = count or self.page_size
+        rows = []
+        sources = table_sources(self.connection, self.index, self.first, self.last, self.source)
+        try:
+            for source in sources:
+                page = self.connection.execute(self.request.format(source),
+                                               (self.last_id, *self.params, limit - len(rows))).fetchall()
+                rows.extend(page)
+                if len(rows) == limit:
+                    self.last_id = page[-1][ID_COLUMN]
+                    return rows
+                self.source += 1
+                self.last_id = -1
+        finally:
+            sources.close()
+        self.done = True
+        return rows
+
+
+def contains(text, string):
+    return text is not None and string in str(text).lower()
+
+
+def equals(text, string):
+    return text is not None and str(text).lower() == string
+
+
+def file_uri(filename, read_only=False):
+    uri = Path(filename).absolute().as_uri()
+    return uri + '?mode=ro' if read_only else uri
+
+
+def connect(filename, read_only=False, **kwargs):
+    # Connections take URIs, so that partitions can be attached read-only;
+    # a read-only file is left at the version it has.
+    connection = sqlite3.connect(file_uri(filename, read_only), uri=True, **kwargs)
+    connection.create_function('contains', 2, contains, deterministic=True)
+    connection.create_function('equals', 2, equals, deterministic=True)
+    for pragma in DB_CONNECTION_PRAGMAS:
+        connection.execute(pragma)
+    if not read_only:
+        upgrade(connection)
+    return connection
+
+
+def main_filename(connection):
+    for _, name, filename in connection.execute('PRAGMA database_list'):
+        if name == 'main':
+            return filename
+
+
+def partition_base(filename):
+    # The file a partition was split from, None if `filename` is not a
+    # partition.
+    if not os.path.exists(filename):
+        return None
+    connection = sqlite3.connect(file_uri(filename, read_only=True), uri=True)
+    try:
+        main, _ = connection.execute(DB_PARTITION_INFO_REQUEST).fetchone()
+    except (sqlite3.Error, TypeError):
+        return None
+    finally:
+        connection.close()
+    return os.path.join(os.path.dirname(filename), main)
+
+
+def schema_name(name):
+    return PARTITION_SCHEMA.format(name.replace('-', '_'))
+
+
+def index_hint(low, high, first, last):
+    # SQLite cannot tell a narrow range from a wide one by its parameters,
+    # so the share of the dates it covers is estimated from the first and
+    # the last date of the table.
+    try:
+        low, high = date.fromisoformat(low).toordinal(), date.fromisoformat(high).toordinal()
+        first = date.fromisoformat(first).toordinal() if first != MIN_DATE_KEY else low
+        last = date.fromisoformat(last).toordinal() if last != MAX_DATE_KEY else high
+    except (TypeError, ValueError):
+        return ' NOT INDEXED'
+    covered = min(last, high) - max(first, low) + 1
+    return '' if covered <= (high - low + 1) * DATE_INDEX_SHARE else ' NOT INDEXED'
+
+
+def conversation_sources(connection, first=None, last=None, start=0):
+    # What the requests over conversations read for the range first..last:
+    # the table itself while no partition of the file overlaps the range,
+    # otherwise a view of the table and of those partitions. Partitions
+    # are attached read-only a few at a time, as SQLite attaches at most
+    # 10 files, so there may be several views to read one after the other;
+    # each is dropped and its files detached once the next is asked for.
+    # `start` skips the first views, for a reader that goes on where it
+    # stopped. Requests without a date condition leave out the range, and
+    # the choice of an index is then left to SQLite.
+    def hint(low, high):
+        return index_hint(low, high, first, last) if bounded else ''
+
+    bounded = first is not None
+    if not bounded:
+        first, last = MIN_DATE_KEY, MAX_DATE_KEY
+    main_hint = hint(*connection.execute(DB_DATE_SPAN_REQUEST).fetchone())
+    partitions = connection.execute(DB_PARTITIONS_REQUEST, (first, last)).fetchall()
+    if not partitions:
+        if not start:
+            yield 'conversations' + main_hint
+        return
+    directory = os.path.dirname(main_filename(connection))
+    for batch_start in range(start * MAX_ATTACHED_PARTITIONS, len(partitions), MAX_ATTACHED_PARTITIONS):
+        batch = partitions[batch_start:batch_start + MAX_ATTACHED_PARTITIONS]
+        selects = [] if batch_start else [f'SELECT * FROM main.conversations{main_hint}']
+        attached = []
+        try:
+            for name, filename, first_date, last_date in batch:
+                schema = schema_name(name)
+                connection.execute(f'ATTACH DATABASE ? AS {schema}',
+                                   (file_uri(os.path.join(directory, filename), read_only=True),))
+                attached.append(schema)
+                selects.append(f'SELECT * FROM {schema}.conversations{hint(first_date, last_date)}')
+            connection.execute(f'CREATE TEMP VIEW {PARTITION_VIEW} AS ' + ' UNION ALL '.join(selects))
+            yield f'{PARTITION_VIEW} AS conversations'
+        finally:
+            connection.execute(f'DROP VIEW IF EXISTS temp.{PARTITION_VIEW}')
+            for schema in attached:
+                connection.execute(f'DETACH DATABASE {schema}')
+
+
+def table_sources(connection, index, first=None, last=None, start=0):
+    # What a request over the whole table reads (see conversation_sources());
+    # a partition opened by itself is read alone.
+    if index == TABLE_CONVERSATIONS_I and not is_partition(connection):
+        yield from conversation_sources(connection, first, last, start)
+    elif not start:
+        yield DB_TABLE_NAMES[index]
+
+
+def is_partition(connection):
+    return any(name == BASE_SCHEMA for _, name, _ in connection.execute('PRAGMA database_list'))
+
+
+def schema_version(connection):
+    version, = connection.execute('PRAGMA user_version').fetchone()
+    return version
+
+
+def needs_upgrade(filename):
+    if not os.path.exists(filename):
+        return False
+    connection = sqlite3.connect(filename)
+    try:
+        return schema_version(connection) < SCHEMA_VERSION
+    finally:
+        connection.close()
+
+
+def upgrade(connection, task=None):
+    # Brings the file to SCHEMA_VERSION in one transaction: an empty file
+    # gets the tables, an older one the migrations it has not had yet.
+    # Foreign keys are off while tables are rebuilt, as SQLite requires.
+    version = schema_version(connection)
+    if version >= SCHEMA_VERSION:
+        return
+    tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if task is not None:
+        connection.set_progress_handler(task.is_cancelled, PROGRESS_STEPS)
+    connection.execute('PRAGMA foreign_keys = OFF')
+    connection.execute('BEGIN')
+    try:
+        if 'conversations' not in tables:
+            requests = DB_CREATE_REQUESTS
+        else:
+            requests = [request for migration_version, migration in DB_MIGRATIONS if version < migration_version
+                        for request in migration]
+        for request in requests:
+            connection.execute(request)
+        connection.execute(DB_VERSION_REQUEST)
+    except sqlite3.Error as e:
+        # An interrupted statement rolls the transaction back by itself.
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        if isinstance(e, sqlite3.OperationalError) and task is not None and task.is_cancelled():
+            raise OperationCancelled
+        raise
+    finally:
+        connection.set_progress_handler(None, 0)
+    connection.execute('COMMIT')
+    connection.execute(DB_WAL_REQUEST)
+    for pragma in DB_CONNECTION_PRAGMAS:
+        connection.execute(pragma)
+
+
+@instrumented()
+def upgrade_file(filename, task=None):
+    connection = sqlite3.connect(filename, isolation_level=None)
+    try:
+        upgrade(connection, task)
+    finally:
+        connection.close()
+
+
+def open_connection(filename, base=None):
+    # A partition is opened read-only with the file it belongs to attached,
+    # so its conversations are read together with the callers and cities
+    # of that file.
+    if base is None:
+        return connect(filename)
+    connection = connect(filename, read_only=True)
+    connection.execute(f'ATTACH DATABASE ? AS {BASE_SCHEMA}', (file_uri(base, read_only=True),))
+    return connection
+
+
+def open_readers(filename, base=None):
+    connection = open_connection(filename, base)
+    readers = [TableReader(connection, i) for i in range(len(DB_COUNT_REQUESTS))]
+    # New conversations must not take the IDs of those in partitions.
+    max_id, = connection.execute(DB_PARTITION_MAX_ID_REQUEST).fetchone()
+    reader = readers[TABLE_CONVERSATIONS_I]
+    if max_id is not None:
+        reader.max_id = max(reader.max_id or 0, max_id)
+    for index in FOREIGN_KEYS.values():
+        readers[index].partition_ids = {str(row_id) for row_id, in
+                                        connection.execute(DB_PARTITION_REFERENCES_REQUEST, (index,))}
+    return connection, readers
+
+
+@instrumented()
+def load_tables(filename):
+    # Every table of the file read in full, for work without the window.
+    connection, readers = open_readers(filename)
+    try:
+        data_tables = [DataTable(i) for i in range(len(readers))]
+        for data_table, reader in zip(data_tables, readers):
+            data_table.load(reader.fetch_all())
+        return data_tables
+    finally:
+        connection.close()
+
+
+def last_change(connection):
+    last, = connection.execute(DB_LAST_CHANGE_REQUEST).fetchone()
+    return last
+
+
+def changes_since(connection, seq):
+    # {table index: keys} of the rows changed after entry `seq` of
+    # row_changes and the last entry, or None for the keys when the entries
+    # right after `seq` have been pruned or the log was reset.
+    entries = connection.execute(DB_CHANGES_SINCE_REQUEST, (seq,)).fetchall()
+    if not entries:
+        return {}, seq
+    if entries[0][0] != seq + 1 or any(index == CHANGES_RESET for _, index, _ in entries):
+        return None, entries[-1][0]
+    changed = {}
+    for _, index, key in entries:
+        changed.setdefault(index, set()).add(key)
+    return changed, entries[-1][0]
+
+
+def prune_changes(cursor):
+    cursor.execute(DB_PRUNE_CHANGES_REQUEST, (last_change(cursor) - CHANGE_LOG_SIZE,))
+
+
+class ChangeWatcher:
+    # Notices commits of other connections to the file by PRAGMA
+    # data_version, which only changes when someone else writes, and reads
+    # what they changed from row_changes. A poll that finds nothing new
+    # costs one PRAGMA.
+    def __init__(self, connection, seq):
+        self.connection = connection
+        self.seq = seq
+        self.data_version = self.version()
+
+    def version(self):
+        version, = self.connection.execute(DB_DATA_VERSION_REQUEST).fetchone()
+        return version
+
+    @instrumented()
+    def poll(self, force=False):
+        # {table index: changed keys}, empty if nothing changed, None if
+        # the changes are no longer known and the file has to be reread.
+        version = self.version()
+        if version == self.data_version and not force:
+            return {}
+        self.data_version = version
+        changed, self.seq = changes_since(self.connection, self.seq)
+        return changed
+
+
+@instrumented(rows=len)
+def read_rows(connection, index, keys):
+    # {key: row} of those of `keys` that are in the table.
+    keys = list(keys)
+    rows = {}
+    for start in range(0, len(keys), FETCH_PAGE_SIZE):
+        batch = keys[start:start + FETCH_PAGE_SIZE]
+        request = DB_SELECT_ROWS_REQUESTS[index].format(', '.join('?' * len(batch)))
+        rows.update((row[ID_COLUMN], row) for row in connection.execute(request, batch))
+    return rows
+
+
+@instrumented()
+def read_pages(filename, index, last_id, total, base=None, task=None):
+    # Runs in a worker thread with its own connection and hands every page
+    # to task.send(); the pages are added to the table by the GUI thread.
+    connection = open_connection(filename, base)
+    try:
+        done = 0
+        while not task.is_cancelled():
+            rows = connection.execute(DB_SELECT_PAGE_REQUESTS[index], (last_id, LOAD_BATCH_SIZE)).fetchall()
+            if rows:
+                last_id = rows[-1][ID_COLUMN]
+                add_rows(len(rows))
+                task.send(rows)
+            done += len(rows)
+            task.report(done, total)
+            if len(rows) < LOAD_BATCH_SIZE:
+                break
+    finally:
+        connection.close()
+
+
+@instrumented()
+def ensure_search_indexes(connection):
+    tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    with connection:
+        for request in DB_SEARCH_INDEX_REQUESTS:
+            connection.execute(request)
+        for name, requests in zip(DB_FULL_TEXT_TABLES, DB_FULL_TEXT_CREATE_REQUESTS):
+            if name is not None and name not in tables:
+                for request in requests:
+                    connection.execute(request)
+
+
+def build_filter_request(index, filters):
+    # The request, with {} for the table it reads, its parameters and the
+    # range of a date filter, None..None without one.
+    id_name = DB_COLUMN_NAMES[index][ID_COLUMN]
+    conditions = [f'{id_name} > ?']
+    params = []
+    first = last = None
+    for name, expression, kind, column_type, string in zip(DB_COLUMN_NAMES[index], DB_COLUMN_EXPRESSIONS[index],
+                                                           DB_FILTER_KINDS[index], COLUMN_TYPES[index], filters):
+        if not string:
+            continue
+        predicate = parse_filter(string, column_type)
+        if predicate[0] == PREDICATE_RANGE and column_type == COLUMN_DATE:
+            first, last = (ordinal_to_iso(ordinal) for ordinal in predicate[1:])
+            conditions.append(f'{name} BETWEEN ? AND ?')
+            params.extend((first, last))
+        elif predicate[0] == PREDICATE_RANGE:
+            conditions.append(f'{name} BETWEEN ? AND ?')
+            params.extend(predicate[1:])
+        elif predicate[0] == PREDICATE_EXACT:
+            conditions.append(f'equals({expression}, ?)')
+            params.append(predicate[1])
+        elif kind == FILTER_SUBSTRING or len(string) < FULL_TEXT_MIN_LENGTH:
+            conditions.append(f'contains({expression}, ?)')
+            params.append(string.lower())
+        else:
+            full_text_name = DB_FULL_TEXT_TABLES[index]
+            conditions.append(f'{id_name} IN (SELECT rowid FROM {full_text_name} WHERE {full_text_name} MATCH ?)')
+            params.append('"' + string.replace('"', '""') + '"')
+    request = f'''SELECT {DB_SELECT_COLUMNS[index]} FROM {{}}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {id_name}
+        LIMIT ?'''
+    return request, params, first, last
+
+
+def is_same_file(filename, other_filename):
+    return other_filename is not None and os.path.exists(filename) and os.path.exists(other_filename) and \
+        os.path.samefile(filename, other_filename)
+
+
+@instrumented()
+def save_changes(filename, changes, source_filename=None, change_seq=None, force=False, task=None):
+    # Writes only inserted, updated and deleted rows in one transaction. When
+    # saving to another file, the opened file is copied there first; a table
+    # that was never opened from a file is written out in full. `changes`
+    # holds DataTable.changes() of every table.
+    # `change_seq` is the last entry of row_changes the window has seen. The
+    # write lock is taken up front (BEGIN IMMEDIATE), so nobody commits
+    # between the check and the writes: rows that others changed since then
+    # and that the save would overwrite raise ConflictError, unless `force`.
+    # Returns the last entry after the save and {table index: keys} of the
+    # rows others changed, which the window has to reread.
+    connection = connect(filename, isolation_level=None)
+    try:
+        if source_filename is not None and not is_same_file(filename, source_filename):
+            source = connect(source_filename)
+            source.backup(connection)
+            source.close()
+
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for request in DB_CREATE_REQUESTS:
+                cursor.execute(request)
+
+            changed = {}
+            if change_seq is not None:
+                changed, _ = changes_since(cursor, change_seq)
+                conflicts = [(i, key) for i, (deleted, updated, _) in enumerate(changes)
+                             for key in sorted({*deleted, *(key for key, _ in updated)})
+                             if changed is None or key in changed.get(i, ())]
+                if conflicts and not force:
+                    raise ConflictError(conflicts)
+
+            if source_filename is None:
+                for request in DB_DELETE_REQUESTS:
+                    cursor.execute(request)
+
+            writer = ChangeWriter(cursor, changes, task)
+            for i, table_changes in enumerate(changes):
+                writer.write_table_changes(i, *table_changes)
+            prune_changes(cursor)
+            seq = last_change(cursor)
+        except (sqlite3.Error, OperationCancelled, ConflictError):
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+    finally:
+        connection.close()
+    return seq, changed
+
+
+class ChangeWriter:
+    def __init__(self, cursor, changes, task=None):
+        self.cursor = cursor
+        self.task = task
+        self.done = 0
+        self.total = sum(len(deleted) + len(updated) + len(inserted) for deleted, updated, inserted in changes)
+
+    def execute(self, request, params):
+        # Statements go out in batches so that a task can report progress
+        # and be cancelled between them.
+        for start in range(0, len(params), SAVE_BATCH_SIZE):
+            if self.task is not None and self.task.is_cancelled():
+                raise OperationCancelled
+            self.cursor.executemany(request, params[start:start + SAVE_BATCH_SIZE])
+            add_rows(len(params[start:start + SAVE_BATCH_SIZE]))
+            if self.task is not None:
+                self.task.report(self.done + min(start + SAVE_BATCH_SIZE, len(params)), self.total)
+        self.done += len(params)
+
+    def write_table_changes(self, index, deleted, updated, inserted):
+        self.execute(DB_DELETE_ROW_REQUESTS[index], [(key,) for key in deleted])
+
+        # Rows whose key changes are first moved to free negative keys, so
+        # that swapping two IDs does not hit the primary key constraint.
+        moved = {key for key, row in updated if str(key) != row[ID_COLUMN]}
+        self.cursor.executemany(DB_UPDATE_ID_REQUESTS[index], ((-key - 1, key) for key in moved))
+        self.execute(DB_UPDATE_REQUESTS[index], [row + (-key - 1 if key in moved else key,) for key, row in updated])
+
+        self.execute(DB_INSERT_REQUESTS[index], inserted)
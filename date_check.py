@@ -1,11 +1,52 @@
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
 
+DIGITS = frozenset('0123456789')
+DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+NO_DATE = 0
 
-class DateCheck:
-    @staticmethod
-    def exactMatch(text):
-        try:
-            _ = datetime.strptime(text, '%d.%m.%Y')
-            return True
-        except ValueError:
-            return False
+
+def is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+@lru_cache(maxsize=1 << 16)
+def date_to_ordinal(text):
+    # dd.mm.yyyy -> date.toordinal(), NO_DATE if the text is not a date.
+    # A table repeats the same few thousand dates, so most calls are
+    # answered by the cache.
+    if len(text) != 10 or text[2] != '.' or text[5] != '.':
+        return NO_DATE
+    day, month, year = text[:2], text[3:5], text[6:]
+    if not DIGITS.issuperset(day + month + year):
+        return NO_DATE
+    day, month, year = int(day), int(month), int(year)
+    if year == 0 or not 1 <= month <= 12:
+        return NO_DATE
+    days = 29 if month == 2 and is_leap_year(year) else DAYS_IN_MONTH[month]
+    if not 1 <= day <= days:
+        return NO_DATE
+    return date(year, month, day).toordinal()
+
+
+def ordinal_to_date(ordinal):
+    value = date.fromordinal(ordinal)
+    return f'{value.day:02}.{value.month:02}.{value.year:04}'
+
+
+def ordinal_to_iso(ordinal):
+    ordinal = min(max(ordinal, 1), date.max.toordinal())
+    return date.fromordinal(ordinal).isoformat()
+
+
+def date_to_iso(text):
+    ordinal = date_to_ordinal(text)
+    return date.fromordinal(ordinal).isoformat() if ordinal != NO_DATE else None
+
+
+def iso_to_date(text):
+    return ordinal_to_date(date.fromisoformat(text).toordinal())
+
+
+def is_date(text):
+    return date_to_ordinal(text) != NO_DATE
@@ -1,52 +1,165 @@
 # Абоненты (Код абонента, Номер телефона, ИНН, Адрес).
 # Города (Код города, Название, Тариф дневной, Тариф ночной).
 # Переговоры (Код переговоров, Код абонента, Код города, Дата, Количество минут, Время суток).
-import sqlite3
-from random import randint, choice
+import argparse
+import math
 import os
+import sqlite3
+from datetime import date, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+from random import Random
+
+from consts import DB_CREATE_REQUESTS, DB_DELETE_REQUESTS, DB_INSERT_REQUESTS, DB_VERSION_REQUEST, DB_WAL_REQUEST, \
+    DB_ROLLUP_DROP_TRIGGER_REQUESTS, DB_ROLLUP_FILL_REQUESTS, DB_ROLLUP_TRIGGER_REQUESTS, \
+    DB_CHANGE_DROP_TRIGGER_REQUESTS, DB_CHANGE_TRIGGER_REQUESTS, TABLE_CALLERS_I, TABLE_CITIES_I, TABLE_CONVERSATIONS_I
+
+# Rows are made and inserted in blocks of this size. Each block has its own
+# random generator, so the output depends only on the seed and not on how
+# the blocks are split between processes.
+BLOCK_SIZE = 100_000
+
+GENERATOR_PRAGMAS = (
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144'
+)
+
+# Set once per process by init_generator(), so that the large weight tables
+# are not sent to the pool with every block.
+options = None
+cities = None
+caller_weights = None
+minute_weights = None
+dates = None
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Заполнение базы данных случайными данными')
+    parser.add_argument('filename', nargs='?', default='data.db')
+    parser.add_argument('--callers', type=int, default=1_000)
+    parser.add_argument('--conversations', type=int, default=1_000)
+    parser.add_argument('--seed', default='0', help='одинаковое зерно даёт одинаковый файл')
+    parser.add_argument('--caller-distribution', choices=('uniform', 'zipf'), default='uniform',
+                        help='распределение звонков по абонентам')
+    parser.add_argument('--caller-skew', type=float, default=1.0, help='показатель степени для zipf')
+    parser.add_argument('--minute-distribution', choices=('uniform', 'exponential'), default='uniform')
+    parser.add_argument('--max-minutes', type=int, default=3 * 60)
+    parser.add_argument('--mean-minutes', type=float, default=10.0, help='среднее для exponential')
+    parser.add_argument('--night-ratio', type=float, default=0.5, help='доля ночных звонков')
+    parser.add_argument('--first-year', type=int, default=2000)
+    parser.add_argument('--last-year', type=int, default=2024)
+    parser.add_argument('--processes', type=int, default=1)
+    return parser.parse_args(args)
+
+
+def read_cities():
+    with open('cities.txt', encoding='utf-8') as file:
+        return sorted(map(str.strip, file.readlines()))
+
+
+def init_generator(generator_options, city_names):
+    global options, cities, caller_weights, minute_weights, dates
+    options = generator_options
+    cities = city_names
+
+    if options.caller_distribution == 'zipf':
+        caller_weights = list(accumulate(1 / rank ** options.caller_skew for rank in range(1, options.callers + 1)))
+    else:
+        caller_weights = None
+
+    if options.minute_distribution == 'exponential':
+        minute_weights = list(accumulate(math.exp(-minute / options.mean_minutes)
+                                         for minute in range(1, options.max_minutes + 1)))
+    else:
+        minute_weights = None
 
-from consts import DB_CREATE_REQUESTS, DB_DELETE_REQUESTS, DB_INSERT_REQUESTS
+    first, last = date(options.first_year, 1, 1), date(options.last_year, 12, 31)
+    dates = [(first + timedelta(days)).strftime('%d.%m.%Y') for days in range((last - first).days + 1)]
 
-city_count = 100
-caller_count = 1_000
-conversation_count = 1_000
 
-with open('cities.txt', encoding='utf-8') as file:
-    cities = sorted(map(str.strip, file.readlines()))
+def block_random(index, block):
+    return Random(f'{options.seed}-{index}-{block}')
 
-try:
-    os.remove('data.db')
-except FileNotFoundError:
-    pass
 
-connection = sqlite3.connect('data.db')
-cursor = connection.cursor()
+def generate_callers(block):
+    start = block * BLOCK_SIZE
+    count = min(BLOCK_SIZE, options.callers - start)
+    rng = block_random(TABLE_CALLERS_I, block)
+    return list(zip(
+        range(start + 1, start + count + 1),
+        [f'89{number:09}' for number in rng.choices(range(10 ** 9), k=count)],
+        [f'{number:012}' for number in rng.choices(range(10 ** 12), k=count)],
+        rng.choices(cities, k=count)
+    ))
 
-for command in DB_CREATE_REQUESTS + DB_DELETE_REQUESTS:
+
+def generate_cities():
+    rng = block_random(TABLE_CITIES_I, 0)
+    return [(item_id + 1, city, rng.randint(1, 20), rng.randint(1, 20)) for item_id, city in enumerate(cities)]
+
+
+def generate_conversations(block):
+    start = block * BLOCK_SIZE
+    count = min(BLOCK_SIZE, options.conversations - start)
+    rng = block_random(TABLE_CONVERSATIONS_I, block)
+    night_ratio = min(max(options.night_ratio, 0.0), 1.0)
+    return list(zip(
+        range(start + 1, start + count + 1),
+        rng.choices(range(1, options.callers + 1), cum_weights=caller_weights, k=count),
+        rng.choices(range(1, len(cities) + 1), k=count),
+        rng.choices(dates, k=count),
+        rng.choices(range(1, options.max_minutes + 1), cum_weights=minute_weights, k=count),
+        rng.choices(('день', 'ночь'), cum_weights=(1 - night_ratio, 1), k=count)
+    ))
+
+
+def block_count(count):
+    return (count + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def generate(generator_options):
+    city_names = read_cities()
+    init_generator(generator_options, city_names)
+
+    try:
+        os.remove(options.filename)
+    except FileNotFoundError:
+        pass
+
+    connection = sqlite3.connect(options.filename, isolation_level=None)
+    cursor = connection.cursor()
+    for pragma in GENERATOR_PRAGMAS:
+        cursor.execute(pragma)
+
+    pool = None
+    if options.processes > 1:
+        pool = Pool(options.processes, initializer=init_generator, initargs=(generator_options, city_names))
     try:
-        cursor.execute(command)
-    except sqlite3.OperationalError as error:
-        print(error)
-        print(command)
-
-datas = [
-    [[item_id + 1,
-      '89' + ''.join(str(randint(0, 9)) for _ in range(9)),
-      ''.join(str(randint(0, 9)) for _ in range(12)),
-      choice(cities)]
-     for item_id in range(caller_count)],
-    [[item_id + 1, city, randint(1, 20), randint(1, 20)]
-     for item_id, city in enumerate(cities)],
-    [[item_id + 1,
-      randint(1, caller_count),
-      randint(1, city_count),
-      f'{randint(1, 28):02}.{randint(1, 12):02}.{randint(2000, 2024)}',
-      randint(1, 3 * 60),
-      choice(('день', 'ночь'))]
-     for item_id in range(conversation_count)],
-]
-for command, data in zip(DB_INSERT_REQUESTS, datas):
-    cursor.executemany(command, data)
-
-connection.commit()
-connection.close()
+        cursor.execute('BEGIN')
+        for command in DB_CREATE_REQUESTS + DB_DELETE_REQUESTS + DB_ROLLUP_DROP_TRIGGER_REQUESTS + \
+                DB_CHANGE_DROP_TRIGGER_REQUESTS + (DB_VERSION_REQUEST,):
+            cursor.execute(command)
+
+        cursor.executemany(DB_INSERT_REQUESTS[TABLE_CITIES_I], generate_cities())
+        for index, function, count in ((TABLE_CALLERS_I, generate_callers, options.callers),
+                                       (TABLE_CONVERSATIONS_I, generate_conversations, options.conversations)):
+            blocks = range(block_count(count))
+            rows = map(function, blocks) if pool is None else pool.imap(function, blocks)
+            for data in rows:
+                cursor.executemany(DB_INSERT_REQUESTS[index], data)
+        for command in DB_ROLLUP_FILL_REQUESTS + DB_ROLLUP_TRIGGER_REQUESTS + DB_CHANGE_TRIGGER_REQUESTS:
+            cursor.execute(command)
+        cursor.execute('COMMIT')
+        cursor.execute(DB_WAL_REQUEST)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        connection.close()
+
+
+if __name__ == '__main__':
+    generate(parse_args())
@@ -0,0 +1,77 @@
+from date_check import date_to_ordinal, NO_DATE
+from consts import COLUMN_NUMBER, COLUMN_DATE, PREDICATE_SUBSTRING, PREDICATE_EXACT, PREDICATE_RANGE, \
+    RANGE_SEPARATOR
+
+# Keys of numbers and dates are integers; MISSING stands for a cell that is
+# not a number or a date and is never inside a range.
+MISSING = -2 ** 63
+MIN_KEY = MISSING + 1
+MAX_KEY = 2 ** 63 - 1
+OPERATORS = ('>=', '<=', '>', '<', '=')
+
+
+def number_key(text):
+    # isdigit() alone also takes digits such as '²', which int() rejects.
+    text = text.strip()
+    if text.isascii() and text.isdigit() and len(text) < 19:
+        return int(text)
+    return MISSING
+
+
+def date_key(text):
+    ordinal = date_to_ordinal(text.strip())
+    return ordinal if ordinal != NO_DATE else MISSING
+
+
+def column_key(column_type):
+    if column_type == COLUMN_NUMBER:
+        return number_key
+    if column_type == COLUMN_DATE:
+        return date_key
+    return None
+
+
+def parse_filter(text, column_type):
+    # The text of a search cell -> predicate:
+    #   =v            exact match (case-insensitive for text columns)
+    #   >v >=v <v <=v comparison, for numbers and dates
+    #   a..b          inclusive range, either end may be left out
+    #   anything else substring, as before
+    # (PREDICATE_SUBSTRING, needle), (PREDICATE_EXACT, text) or
+    # (PREDICATE_RANGE, first key, last key).
+    key = column_key(column_type)
+    stripped = text.strip()
+    if stripped.startswith('='):
+        if key is None:
+            return PREDICATE_EXACT, stripped[1:].strip().lower()
+        value = key(stripped[1:])
+        if value != MISSING:
+            return PREDICATE_RANGE, value, value
+    elif key is not None:
+        bounds = parse_bounds(stripped, key)
+        if bounds is not None:
+            return (PREDICATE_RANGE, *bounds)
+    return PREDICATE_SUBSTRING, text.lower()
+
+
+def parse_bounds(text, key):
+    for operator in OPERATORS[:-1]:
+        if text.startswith(operator):
+            value = key(text[len(operator):])
+            if value == MISSING:
+                return None
+            if operator == '>=':
+                return value, MAX_KEY
+            if operator == '<=':
+                return MIN_KEY, value
+            if operator == '>':
+                return value + 1, MAX_KEY
+            return MIN_KEY, value - 1
+
+    if RANGE_SEPARATOR in text:
+        first, last = text.split(RANGE_SEPARATOR, 1)
+        first = key(first) if first.strip() else MIN_KEY
+        last = key(last) if last.strip() else MAX_KEY
+        if first != MISSING and last != MISSING:
+            return first, last
+    return None
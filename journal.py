@@ -0,0 +1,79 @@
+import getpass
+import json
+import os
+from consts import JOURNAL_SUFFIX, JOURNAL_SYNC_RECORDS, JOURNAL_BASE
+from profiling import instrumented
+
+
+def journal_path(filename):
+    # Next to the file and per user, as several users may open a shared file.
+    return filename + JOURNAL_SUFFIX.format(getpass.getuser())
+
+
+class EditJournal:
+    # Edits made since the last save, appended to a sidecar of the file as
+    # JSON lines: [JOURNAL_BASE, last entry of row_changes] first, then
+    # [kind, table index, key, ...] for every edit. Rows are referred to by
+    # DataTable.keys, which is negative for rows added since the save. The
+    # file is flushed and synced in batches, by sync() on a timer or after
+    # JOURNAL_SYNC_RECORDS records, so an edit costs a buffered write.
+    # A journal that was replayed is continued (`resume`), any other one is
+    # started anew on the first edit.
+    def __init__(self, filename, change_seq, resume=False):
+        self.path = journal_path(filename)
+        self.change_seq = change_seq
+        self.resume = resume
+        self.file = None
+        self.pending = 0
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self.path, 'a' if self.resume else 'w', encoding='utf-8')
+            if not self.resume:
+                self.file.write(json.dumps([JOURNAL_BASE, self.change_seq]) + '\n')
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.pending += 1
+        if self.pending >= JOURNAL_SYNC_RECORDS:
+            self.sync()
+
+    def sync(self):
+        if self.file is None or not self.pending:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        # The edits are in the file now.
+        self.close()
+        self.resume = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+@instrumented(rows=lambda result: len(result[1]) if result is not None else 0)
+def read_journal(filename):
+    # (last entry of row_changes, records) of the journal of a file, None if
+    # there is none. A crash can leave the last line cut short; reading
+    # stops at the first line that does not parse.
+    path = journal_path(filename)
+    if not os.path.exists(path):
+        return None
+    records = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    if not records or records[0][0] != JOURNAL_BASE:
+        return None
+    return records[0][1], records[1:]
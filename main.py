@@ -1,41 +1,146 @@
+import os
 import sys
 import sqlite3
+from profiling import profiler, instrumented, add_rows, startup
 from consts import *
 from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QTableWidgetItem, QMessageBox
 from main_window import Ui_MainWindow as MainWindowUi
+from data_store import DataTable
+from table_model import TableModel, QueryModel
+from database import open_readers, save_changes, connect, ensure_search_indexes, read_pages, QueryReader, \
+    OperationCancelled, needs_upgrade, upgrade_file, ChangeWatcher, ConflictError, last_change, read_rows, \
+    partition_base, is_same_file
+from validation import Validator
+from search import SearchIndex
+from sorting import TableSorter
+from workers import BackgroundTask
+from journal import EditJournal, read_journal
 
 
 class MainWindow(MainWindowUi, QMainWindow):
     def __init__(self):
         super().__init__()
         self.setupUi(self)
-        self.setWindowIcon(QIcon('icon.ico'))
+        self.setWindowIcon(QIcon(ICON_FILE))
+        self.painted = False
 
         self.action_new.triggered.connect(self.action_on_new)
         self.action_open.triggered.connect(self.action_on_open)
         self.action_save.triggered.connect(self.action_on_save)
+        self.action_import.triggered.connect(self.action_on_import)
+        self.action_export.triggered.connect(self.action_on_export)
         self.action_exit.triggered.connect(self.close)
         self.action_add.triggered.connect(self.action_on_add)
         self.action_delete.triggered.connect(self.action_on_delete)
         self.action_search.triggered.connect(self.action_on_search)
+        self.action_search_file.triggered.connect(self.action_on_search_file)
+        self.billing_button.clicked.connect(self.action_on_billing)
+        self.billing_date_from.returnPressed.connect(self.action_on_billing)
+        self.billing_date_to.returnPressed.connect(self.action_on_billing)
+        self.analytics_button.clicked.connect(self.action_on_analytics)
+        self.analytics_month_from.returnPressed.connect(self.action_on_analytics)
+        self.analytics_month_to.returnPressed.connect(self.action_on_analytics)
+        self.action_profile.triggered.connect(self.action_on_profile)
+        self.action_profile_report.triggered.connect(self.action_on_profile_report)
+        self.action_profile_save.triggered.connect(self.action_on_profile_save)
+        self.action_profile.setChecked(profiler.enabled)
 
         self.tables = [self.table_callers, self.table_cities, self.table_conversations]
         self.searches = [self.search_callers, self.search_cities, self.search_conversations]
         self.results = [self.result_callers, self.result_cities, self.result_conversations]
 
-        for table, search, result in zip(self.tables, self.searches, self.results):
-            table.itemChanged.connect(self.check_table_value)
-            search.cellChanged.connect(self.update_result)
-            result.cellChanged.connect(self.edit_table)
+        self.connection = None
+        self.watcher = None
+        self.journal = None
+        self.filename = None
+        self.base = None
+        self.loading_index = None
+        self.task_running = False
+        self.data_tables = [DataTable(i) for i in range(len(self.tables))]
+        self.validator = Validator(self.data_tables)
+        self.search_indexes = [SearchIndex(data_table) for data_table in self.data_tables]
+        self.sorters = [TableSorter(data_table) for data_table in self.data_tables]
+        self.models = [TableModel(data_table, sorter) for data_table, sorter in zip(self.data_tables, self.sorters)]
+        self.result_models = [TableModel(data_table, sorter, is_result=True)
+                              for data_table, sorter in zip(self.data_tables, self.sorters)]
+        self.query_models = [QueryModel(headers) for headers in HEADERS]
+        self.billing_models = [QueryModel(headers) for headers in BILLING_HEADERS]
+        self.billing_callers.setModel(self.billing_models[0])
+        self.billing_cities.setModel(self.billing_models[1])
+        self.analytics_models = [QueryModel(headers) for headers in ANALYTICS_HEADERS]
+        for view, model in zip((self.analytics_callers, self.analytics_cities, self.analytics_months),
+                               self.analytics_models):
+            view.setModel(model)
+
+        for table, search, result, model, result_model in zip(self.tables, self.searches, self.results,
+                                                              self.models, self.result_models):
+            table.setModel(model)
+            result.setModel(result_model)
+            model.cellEdited.connect(self.check_table_value)
+            model.rowsFetched.connect(self.check_fetched_rows)
+            model.rowsInserted.connect(self.update_status)
+            model.rowsRemoved.connect(self.update_status)
+            model.modelReset.connect(self.update_status)
+            search.cellChanged.connect(self.schedule_update_result)
+            search.setToolTip(SEARCH_HINT)
+            result_model.cellEdited.connect(self.edit_table)
+            for view in (table, result):
+                header = view.horizontalHeader()
+                header.setSortIndicatorShown(True)
+                header.setSortIndicator(-1, Qt.AscendingOrder)
+                header.sortIndicatorChanged.connect(self.action_on_sort)
+        self.tab_widget.currentChanged.connect(self.update_status)
+
+        self.pending_search = None
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.update_result)
+
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(WATCH_INTERVAL)
+        self.watch_timer.timeout.connect(self.check_file_changes)
+        self.watch_timer.start()
+
+        self.journal_timer = QTimer(self)
+        self.journal_timer.setInterval(JOURNAL_SYNC_INTERVAL)
+        self.journal_timer.timeout.connect(self.sync_journal)
+        self.journal_timer.start()
+
+        # A new window already is an empty file, so only the title and the
+        # search widgets are set up before it is shown.
+        self.setWindowTitle(f'{WINDOW_TITLE}{NO_NAME}')
+        self.action_on_search(False)
+        startup.mark('window')
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            startup.mark('first_paint')
+            QTimer.singleShot(0, self.finish_startup)
 
-        self.action_on_new()
-        self.action_on_search(self.action_search.isChecked())
+    def finish_startup(self):
+        # Runs once the first paint is done and the event loop is free.
+        startup.mark('ready')
+        if os.environ.get(STARTUP_ENVIRONMENT):
+            print(startup.report(), file=sys.stderr)
 
     def action_on_new(self):
-        for table, headers in zip(self.tables, HEADERS):
-            fill_table_with_data(table, [headers])
+        self.close_connection()
+        self.filename = None
+        self.base = None
+        self.set_read_only(False)
+        for model in self.models:
+            model.load([])
+        self.show_sort_indicators()
+        self.validator.reset()
+        for search_index in self.search_indexes:
+            search_index.reset()
+        for model in self.billing_models + self.analytics_models:
+            model.set_rows([])
 
         caption = NO_NAME
         self.setWindowTitle(f'{WINDOW_TITLE}{caption}')
@@ -43,182 +148,533 @@ class MainWindow(MainWindowUi, QMainWindow):
         self.action_on_search(False)
         self.action_search.setChecked(False)
 
+    @instrumented()
     def action_on_open(self):
         filename, _ = QFileDialog.getOpenFileName(self, 'Открыть', '.', 'Базы данных (*.db)')
-        if not filename:
-            return
-
-        for table in self.tables:
-            table.itemChanged.disconnect(self.check_table_value)
+        if filename:
+            self.open_file(filename)
+
+    def open_file(self, filename):
+        # Files of an older version are upgraded in place first; a large
+        # file takes a while, so it is done by a cancellable task. A
+        # partition is opened read-only, and it is the file it belongs to
+        # that is upgraded.
+        base = partition_base(filename)
+        if needs_upgrade(base or filename):
+            task = self.run_task(UPGRADE_MESSAGE, upgrade_file, base or filename)
+            if task.cancelled:
+                self.show_message(ERROR_MESSAGES.get(OPERATION_CANCELLED))
+                return
+            if task.error is not None:
+                self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{task.error}')
+                return
 
         *_, caption = filename.split('/')
-        self.setWindowTitle(f'{WINDOW_TITLE}{caption}')
-
-        connection = sqlite3.connect(filename)
-        cursor = connection.cursor()
-
-        data_tables = [
-            cursor.execute('SELECT * FROM callers').fetchall(),
-            cursor.execute('SELECT * FROM cities').fetchall(),
-            cursor.execute('SELECT * FROM conversations').fetchall()
-        ]
-
-        connection.close()
-
-        for data, headers, table in zip(data_tables, HEADERS, self.tables):
-            data.insert(0, headers)
-            fill_table_with_data(table, data)
-            table.itemChanged.connect(self.check_table_value)
+        self.setWindowTitle(f'{WINDOW_TITLE}{caption}{READ_ONLY_CAPTION if base else ""}')
+
+        # The unsaved edits of a file that is read again are kept to be
+        # replayed; those of a file that is left are dropped.
+        self.close_connection(keep_journal=is_same_file(filename, self.filename))
+        self.connection, readers = open_readers(filename, base)
+        self.watcher = ChangeWatcher(self.connection, last_change(self.connection)) if base is None else None
+        self.filename = filename
+        self.base = base
+        self.set_read_only(base is not None)
+
+        # Callers and cities are loaded in full, so the foreign keys of every
+        # fetched page of conversations can be checked right away.
+        self.validator.reset()
+        for search_index in self.search_indexes:
+            search_index.reset()
+        for model in self.billing_models + self.analytics_models:
+            model.set_rows([])
+        for i, (reader, model) in enumerate(zip(readers, self.models)):
+            model.load(reader.fetch(), reader)
+            self.validator.rows_added(i, range(model.table.slot_count()))
+            if i != TABLE_CONVERSATIONS_I:
+                self.load_remaining_rows([i])
+        self.show_sort_indicators()
 
         self.action_on_search(False)
         self.action_search.setChecked(False)
-
+        if base is None:
+            self.restore_journal(filename)
+
+    def set_read_only(self, read_only):
+        for action in (self.action_save, self.action_import, self.action_add, self.action_delete):
+            action.setEnabled(not read_only)
+        for model in self.models + self.result_models:
+            model.read_only = read_only
+
+    def restore_journal(self, filename):
+        # Edits that were not saved before the window crashed or was killed
+        # are replayed on top of the file. They need every row, so the
+        # tables are read in full first; if that is cancelled, the journal
+        # is left for the next time.
+        restored = read_journal(filename)
+        if restored is None:
+            self.journal = EditJournal(filename, self.watcher.seq)
+            return
+        change_seq, records = restored
+        if not self.load_remaining_rows(range(len(self.data_tables))):
+            return
+        self.replay_journal(records)
+        if not any(data_table.has_changes() for data_table in self.data_tables):
+            # Everything in it was saved or made by someone else meanwhile.
+            self.journal = EditJournal(filename, self.watcher.seq)
+            self.journal.discard()
+            return
+        self.journal = EditJournal(filename, change_seq, resume=True)
+
+        # Rows others changed since the journal was started are reread, and
+        # those of them edited here become conflicts.
+        if change_seq < self.watcher.seq:
+            self.watcher.seq = change_seq
+            changed = self.watcher.poll(force=True)
+            if changed is None:
+                self.statusBar().showMessage(FILE_CHANGED_MESSAGE)
+            else:
+                self.apply_file_changes(changed)
+        self.show_message(JOURNAL_RESTORED_MESSAGE.format(len(records)))
+
+    @instrumented(rows=len)
+    def replay_journal(self, records):
+        for kind, index, key, *args in records:
+            if kind == JOURNAL_ADD:
+                self.add_row(index, tuple(args[0]), key)
+                continue
+            slot = self.data_tables[index].key_slot(key)
+            if slot is None:
+                continue
+            if kind == JOURNAL_SET:
+                col, text = args
+                old_text = self.data_tables[index].value(slot, col)
+                self.data_tables[index].set_value(slot, col, text)
+                self.validator.cell_changed(index, slot, col, old_text)
+                self.search_indexes[index].rows_changed([slot])
+                self.models[index].rows_changed([slot])
+            elif kind == JOURNAL_DELETE:
+                self.delete_slot(index, slot)
+        self.update_cells()
+
+    def log_edit(self, *record):
+        if self.journal is not None:
+            self.journal.write(record)
+
+    def sync_journal(self):
+        if self.journal is not None:
+            self.journal.sync()
+
+    @instrumented()
     def action_on_save(self):
         filename, _ = QFileDialog.getSaveFileName(self, 'Сохранить', '', 'Базы данных (*.db)')
         if not filename:
             return
 
-        status = self.check_for_errors()
-
+        # Changes of others are not applied while the save is asked about.
+        self.watch_timer.stop()
         try:
+            status = self.check_for_errors()
             if status == DATA_CORRECT:
-                data_tables = [[[table.item(row, col).text()
-                                 for col in range(table.columnCount())]
-                                for row in range(1, table.rowCount())]
-                               for table in self.tables]
+                conflicts = [(i, key) for i, data_table in enumerate(self.data_tables)
+                             for key in sorted(data_table.conflicts & data_table.pending_keys())]
+                if conflicts and not self.confirm_overwrite(conflicts):
+                    raise OperationCancelled
+                task = self.save_file(filename, force=bool(conflicts))
+                if isinstance(task.error, ConflictError):
+                    if not self.confirm_overwrite(task.error.conflicts):
+                        raise OperationCancelled
+                    task = self.save_file(filename, force=True)
+                if task.cancelled:
+                    raise OperationCancelled
+                if task.error is not None:
+                    raise task.error
+                change_seq, changed = task.result
+                for data_table in self.data_tables:
+                    data_table.mark_saved()
+                # The journal is compacted to nothing: every edit is saved.
+                if self.journal is not None:
+                    self.journal.discard()
+                self.filename = filename
+                self.close_connection()
+                self.connection = connect(filename)
+                self.watcher = ChangeWatcher(self.connection, change_seq)
+                self.journal = EditJournal(filename, change_seq)
+                self.journal.discard()
+                self.apply_file_changes(changed)
+                self.apply_file_changes(self.watcher.poll(force=True))
 
                 *_, caption = filename.split('/')
                 self.setWindowTitle(f'{WINDOW_TITLE}{caption}')
-
-                connection = sqlite3.connect(filename)
-                cursor = connection.cursor()
-
-                for request in DB_CREATE_REQUESTS:
-                    cursor.execute(request)
-
-                for request in DB_DELETE_REQUESTS:
-                    cursor.execute(request)
-
-                for request, data in zip(DB_INSERT_REQUESTS, data_tables):
-                    cursor.executemany(request, data)
-
-                connection.commit()
-                connection.close()
         except sqlite3.Error as e:
             status = OPERATION_ERROR
             message = ERROR_MESSAGES.get(status) + f'{e}'
+        except OperationCancelled:
+            status = OPERATION_CANCELLED
+            message = ERROR_MESSAGES.get(status)
         else:
             message = ERROR_MESSAGES.get(status)
+        finally:
+            self.watch_timer.start()
 
         self.show_message(message)
 
         self.action_on_search(False)
         self.action_search.setChecked(False)
 
+    def save_file(self, filename, force=False):
+        changes = [data_table.changes() for data_table in self.data_tables]
+        change_seq = self.watcher.seq if self.watcher is not None else None
+        return self.run_task(SAVING_MESSAGE, save_changes, filename, changes, self.filename, change_seq, force)
+
+    def confirm_overwrite(self, conflicts):
+        keys = []
+        for i, headers in enumerate(HEADERS):
+            table_keys = [str(key) for index, key in conflicts if index == i]
+            if table_keys:
+                more = '…' if len(table_keys) > MAX_CONFLICT_KEYS else ''
+                keys.append(CONFLICT_KEYS.format(headers[ID_COLUMN], ', '.join(table_keys[:MAX_CONFLICT_KEYS]) + more))
+        answer = QMessageBox.question(self, 'Информация', CONFLICT_MESSAGE.format('; '.join(keys)))
+        return answer == QMessageBox.Yes
+
+    def check_file_changes(self):
+        # Runs on a timer; rows other processes committed to the file are
+        # reread into the tables.
+        if self.watcher is None or self.task_running:
+            return
+        try:
+            changed = self.watcher.poll()
+        except sqlite3.Error:
+            return
+        self.apply_file_changes(changed)
+
+    @instrumented()
+    def apply_file_changes(self, changed):
+        if changed is None:
+            if any(data_table.has_changes() for data_table in self.data_tables):
+                self.statusBar().showMessage(FILE_CHANGED_MESSAGE)
+            else:
+                self.open_file(self.filename)
+            return
+        for index in sorted(changed):
+            self.refresh_rows(index, changed[index])
+        if not changed:
+            return
+        self.update_cells()
+        if self.action_search.isChecked():
+            for index in changed:
+                self.update_result(search=self.searches[index])
+
+    def refresh_rows(self, index, keys):
+        # Rows are reread by key: a key that is gone from the file was
+        # deleted, one that is new was inserted. Rows edited here are left
+        # as they are and become conflicts for the next save.
+        data_table, model = self.data_tables[index], self.models[index]
+        reader = data_table.source
+        rows = read_rows(self.connection, index, keys)
+        new_rows = []
+        unloaded = False
+        for key in sorted(keys):
+            row = rows.get(key)
+            slot = data_table.key_slot(key)
+            if slot is None:
+                if key in data_table.deleted:
+                    if row is None:
+                        data_table.deleted.discard(key)
+                    else:
+                        data_table.conflicts.add(key)
+                elif reader is not None and not reader.is_loaded(key):
+                    unloaded = True
+                elif row is not None:
+                    new_rows.append(row)
+            elif data_table.is_edited(slot):
+                data_table.conflicts.add(key)
+            elif row is None:
+                text = data_table.value(slot, ID_COLUMN)
+                self.result_models[index].remove_slot(slot)
+                model.remove_slot(slot, record=False)
+                self.validator.row_removed(index, slot, text)
+                self.search_indexes[index].rows_changed([slot])
+            else:
+                for col, value in enumerate(row):
+                    old_text = data_table.value(slot, col)
+                    if str(value) != old_text:
+                        data_table.set_value(slot, col, str(value), record=False)
+                        self.validator.cell_changed(index, slot, col, old_text)
+                self.search_indexes[index].rows_changed([slot])
+                model.rows_changed([slot])
+        if unloaded:
+            reader.recount()
+        model.add_fetched_rows(new_rows)
+
+    @instrumented()
+    def action_on_import(self):
+        # Rows are checked and written straight into the saved file, then the
+        # file is opened again; unsaved edits would be lost, so they block it.
+        index = self.tab_widget.currentIndex()
+        if index >= len(self.data_tables):
+            return
+        if self.filename is None or any(data_table.has_changes() for data_table in self.data_tables):
+            self.show_message(SAVE_FIRST_MESSAGE)
+            return
+        source, _ = QFileDialog.getOpenFileName(self, 'Импорт', '.', TRANSFER_FILTER)
+        if not source:
+            return
+
+        from transfer import import_table, report_filename
+
+        report = report_filename(source)
+        task = self.run_task(IMPORT_MESSAGE, import_table, self.filename, index, source, report)
+        if task.cancelled:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_CANCELLED))
+            return
+        if task.error is not None:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{task.error}')
+            return
+        imported, rejected = task.result
+        message = IMPORT_RESULT_MESSAGE.format(imported, rejected)
+        if rejected:
+            message += '\n' + REJECTED_REPORT_MESSAGE.format(report)
+        self.open_file(self.filename)
+        self.show_message(message)
+
+    @instrumented()
+    def action_on_export(self):
+        # The table is read from the saved file, like the billing report.
+        index = self.tab_widget.currentIndex()
+        if index >= len(self.data_tables):
+            return
+        if self.filename is None:
+            self.show_message(SAVE_FIRST_MESSAGE)
+            return
+        target, _ = QFileDialog.getSaveFileName(self, 'Экспорт', '', TRANSFER_FILTER)
+        if not target:
+            return
+
+        from transfer import export_table
+
+        task = self.run_task(EXPORT_MESSAGE, export_table, self.filename, index, target, self.base)
+        if task.cancelled:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_CANCELLED))
+            return
+        if task.error is not None:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{task.error}')
+            return
+        self.show_message(EXPORT_RESULT_MESSAGE.format(task.result))
+        if any(data_table.has_changes() for data_table in self.data_tables):
+            self.statusBar().showMessage(UNSAVED_CHANGES_MESSAGE)
+
+    def run_task(self, title, function, *args, on_batch=None):
+        self.menuBar().setEnabled(False)
+        self.centralWidget().setEnabled(False)
+        self.task_running = True
+        try:
+            return BackgroundTask(self, title, function, *args, on_batch=on_batch).run()
+        finally:
+            self.task_running = False
+            self.menuBar().setEnabled(True)
+            self.centralWidget().setEnabled(True)
+
+    def load_remaining_rows(self, indexes):
+        for index in indexes:
+            data_table = self.data_tables[index]
+            if not data_table.can_fetch_more():
+                continue
+            reader = data_table.source
+            reader.busy = True
+            self.loading_index = index
+            try:
+                task = self.run_task(LOADING_MESSAGE, read_pages, self.filename, index, reader.last_id,
+                                     reader.remaining(), self.base, on_batch=self.add_loaded_rows)
+            finally:
+                reader.busy = False
+                self.loading_index = None
+            if task.error is not None:
+                raise task.error
+            if task.cancelled:
+                return False
+            reader.done = True
+        return True
+
+    @instrumented()
+    def add_loaded_rows(self, rows):
+        add_rows(len(rows))
+        self.data_tables[self.loading_index].source.advance(rows)
+        self.models[self.loading_index].add_fetched_rows(rows)
+
+    def closeEvent(self, event):
+        # The last connection to a file moves its write-ahead log into it,
+        # so no -wal file is left next to the file.
+        self.close_connection()
+        super().closeEvent(event)
+
+    def close_connection(self, keep_journal=False):
+        # The journal is there for a window that did not get to close: a
+        # file closed by New, Open or closing the window leaves none.
+        self.watcher = None
+        if self.journal is not None:
+            if keep_journal:
+                self.journal.close()
+            else:
+                self.journal.discard()
+            self.journal = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def update_status(self, *_):
+        index = self.tab_widget.currentIndex()
+        if index >= len(self.data_tables):
+            self.statusBar().clearMessage()
+            return
+        data_table = self.data_tables[index]
+        self.statusBar().showMessage(ROWS_COUNT_MESSAGE.format(data_table.row_count(), data_table.total_count()))
+
+    @instrumented()
+    def check_fetched_rows(self, start, stop):
+        add_rows(stop - start)
+        index = self.models.index(self.sender())
+        self.validator.rows_added(index, range(start, stop))
+        self.search_indexes[index].rows_changed(range(start, stop))
+
     def show_message(self, message):
         message_box = QMessageBox(self)
         message_box.setWindowTitle('Информация')
         message_box.setText(message)
         message_box.exec_()
 
+    @instrumented()
     def check_for_errors(self):
-        def update_first_incorrect_cell(table_i, cell_row, cell_col):
-            nonlocal first_incorrect_cell
-            if first_incorrect_cell == (-1, -1, -1):
-                first_incorrect_cell = table_i, cell_row, cell_col
-
-        status = DATA_CORRECT
-        first_incorrect_cell = -1, -1, -1
-        for i, table in enumerate(self.tables):
-            table.itemChanged.disconnect(self.check_table_value)
-            for row in range(1, table.rowCount()):
-                for col in range(table.columnCount()):
-                    if not self.check_table_value(table.item(row, col), table, do_reconnect=False,
-                                                  check_unique=False, check_foreign_key=False):
-                        status = DATA_FORMAT_ERROR
-                        update_first_incorrect_cell(i, row, col)
-
-        for i, table in enumerate(self.tables):
-            ids = set()
-            for row in range(1, table.rowCount()):
-                item = table.item(row, ID_COLUMN)
-                text = item.text()
-                if text in ids:
-                    status = DATA_UNIQUE_ERROR
-                    update_first_incorrect_cell(i, row, ID_COLUMN)
-                    self.item_change_color(item, table, RED, do_reconnect=False)
-                ids.add(text)
-
-        caller_ids = [self.table_callers.item(row, ID_COLUMN).text() for row in range(1, self.table_callers.rowCount())]
-        city_ids = [self.table_cities.item(row, ID_COLUMN).text() for row in range(1, self.table_cities.rowCount())]
-        for row in range(1, self.table_conversations.rowCount()):
-            caller_item = self.table_conversations.item(row, CALLER_ID_COLUMN)
-            city_item = self.table_conversations.item(row, CITY_ID_COLUMN)
-            if caller_item.text() not in caller_ids:
-                status = DATA_ID_ERROR
-                update_first_incorrect_cell(TABLE_CONVERSATIONS_I, row, CALLER_ID_COLUMN)
-                self.item_change_color(caller_item, self.table_conversations, RED, do_reconnect=False)
-            if city_item.text() not in city_ids:
-                status = DATA_ID_ERROR
-                update_first_incorrect_cell(TABLE_CONVERSATIONS_I, row, CITY_ID_COLUMN)
-                self.item_change_color(city_item, self.table_conversations, RED, do_reconnect=False)
-
-        for table in self.tables:
-            table.itemChanged.connect(self.check_table_value)
-
-        if first_incorrect_cell != (-1, -1, -1):
-            i, row, col = first_incorrect_cell
+        if not self.load_remaining_rows(range(len(self.data_tables))):
+            return OPERATION_CANCELLED
+
+        status = self.validator.status()
+
+        first_incorrect_cell = self.validator.first_incorrect_cell()
+        if first_incorrect_cell is not None:
+            i, slot, col = first_incorrect_cell
             self.tab_widget.setCurrentIndex(i)
-            table = self.tables[self.tab_widget.currentIndex()]
-            table.scrollToItem(table.item(row, col))
+            model = self.models[i]
+            self.tables[i].scrollTo(model.index(model.row_of(slot), col))
 
         return status
 
+    @instrumented()
     def action_on_add(self):
         index = self.tab_widget.currentIndex()
-        if self.action_search.isChecked():
-            for table in (self.tables[index], self.results[index]):
-                row = table.rowCount()
-                insert_into_table(row, table, index)
-        else:
-            table = self.tables[index]
-            row = table.rowCount()
-            insert_into_table(row, table, index)
-
+        if index >= len(self.data_tables):
+            return
+        data_table = self.data_tables[index]
+        values = data_table.default_row()
+        slot = self.add_row(index, values)
+        self.log_edit(JOURNAL_ADD, index, data_table.keys[slot], values)
+        self.update_cells()
+
+    def add_row(self, index, values, key=None):
+        slot = self.models[index].append_row(values, key)
+        self.validator.rows_added(index, [slot])
+        self.search_indexes[index].rows_changed([slot])
+        if self.action_search.isChecked() and not self.file_search_enabled():
+            self.result_models[index].append_slot(slot)
+        return slot
+
+    @instrumented()
     def action_on_delete(self):
+        index = self.tab_widget.currentIndex()
+        if index >= len(self.data_tables):
+            return
+        if self.action_search.isChecked() and self.file_search_enabled():
+            return
         if self.action_search.isChecked():
-            table = self.results[self.tab_widget.currentIndex()]
+            table = self.results[index]
         else:
-            table = self.tables[self.tab_widget.currentIndex()]
-        row = table.currentRow()
-        item_id = table.item(row, ID_COLUMN).text()
-        if row != 0:
-            table.removeRow(row)
+            table = self.tables[index]
+        current = table.currentIndex()
+        if not current.isValid():
+            return
+        slot = table.model().slot(current.row())
+        self.log_edit(JOURNAL_DELETE, index, self.data_tables[index].keys[slot])
+        self.delete_slot(index, slot)
+        self.update_cells()
+
+    def delete_slot(self, index, slot):
+        text = self.data_tables[index].value(slot, ID_COLUMN)
+        self.result_models[index].remove_slot(slot)
+        self.models[index].remove_slot(slot)
+        self.validator.row_removed(index, slot, text)
+        self.search_indexes[index].rows_changed([slot])
+
+    @instrumented()
+    def action_on_sort(self, col, order):
+        # A sort needs every row, so the rest of a large table is read
+        # first, by a task that can be cancelled; the search results are
+        # sorted the same way.
+        index = self.tab_widget.currentIndex()
+        if index >= len(self.data_tables):
+            return
+        if col != -1 and self.load_remaining_rows([index]):
+            self.models[index].sort(col, order)
+            self.result_models[index].sort(col, order)
+        self.show_sort_indicators([index])
+
+    def show_sort_indicators(self, indexes=None):
+        for i in range(len(self.data_tables)) if indexes is None else indexes:
+            sorter, model = self.sorters[i], self.models[i]
+            col = sorter.col if sorter.is_active() else -1
+            order = Qt.DescendingOrder if model.descending else Qt.AscendingOrder
+            for view in (self.tables[i], self.results[i]):
+                header = view.horizontalHeader()
+                header.blockSignals(True)
+                header.setSortIndicator(col, order)
+                header.blockSignals(False)
+
+    def file_search_enabled(self):
+        return self.action_search_file.isChecked() and self.connection is not None
+
+    def action_on_search_file(self, checked):
+        if checked and self.connection is not None:
+            # A partition is searched with the indexes of its file.
+            connection = connect(self.base) if self.base is not None else self.connection
+            try:
+                ensure_search_indexes(connection)
+            except sqlite3.Error as e:
+                self.action_search_file.setChecked(False)
+                self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{e}')
+            finally:
+                if connection is not self.connection:
+                    connection.close()
         if self.action_search.isChecked():
-            table = self.tables[self.tab_widget.currentIndex()]
-            for row in range(1, table.rowCount()):
-                if table.item(row, ID_COLUMN).text() == item_id:
-                    table.removeRow(row)
-                    break
+            self.action_on_search(True)
 
+    @instrumented()
     def action_on_search(self, checked):
-        status = self.check_for_errors()
+        file_search = self.file_search_enabled()
+        try:
+            status = self.check_for_errors() if checked and not file_search else DATA_CORRECT
+        except sqlite3.Error as e:
+            self.action_search.setChecked(False)
+            self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{e}')
+            return
 
         if status == DATA_CORRECT or not checked:
             if checked:
                 for table in self.tables:
                     table.hide()
-                for table, search, result in zip(self.tables, self.searches, self.results):
+                for i, (data_table, search, result) in enumerate(zip(self.data_tables, self.searches, self.results)):
                     search.show()
-                    search.cellChanged.disconnect(self.update_result)
-                    fill_table_with_data(search, [['' for _ in range(table.columnCount())]], with_headers=False)
-                    search.cellChanged.connect(self.update_result)
+                    search.cellChanged.disconnect(self.schedule_update_result)
+                    fill_table_with_data(search, [['' for _ in range(data_table.column_count())]],
+                                         with_headers=False)
+                    search.cellChanged.connect(self.schedule_update_result)
 
-                    result.cellChanged.disconnect(self.edit_table)
                     result.show()
-                    data = [get_table_headers(table)] + get_table_data(table)
-                    fill_table_with_data(result, data)
-                    result.cellChanged.connect(self.edit_table)
+                    if file_search:
+                        result.setModel(self.query_models[i])
+                        self.query_models[i].set_reader(
+                            QueryReader(self.connection, i, [''] * data_table.column_count()))
+                    else:
+                        result.setModel(self.result_models[i])
+                        self.result_models[i].set_result_slots(data_table.order[:])
             else:
                 for table in self.tables:
                     table.show()
@@ -230,84 +686,136 @@ class MainWindow(MainWindowUi, QMainWindow):
             message = ERROR_MESSAGES.get(status)
             self.show_message(message)
 
-    def check_table_value(self, item, table=None, do_reconnect=True, check_unique=True, check_foreign_key=True):
-        if item.row() == 0:
+    @instrumented()
+    def action_on_billing(self):
+        # Costs are summed by SQLite over the saved file, so unsaved edits
+        # are not part of the report.
+        if self.filename is None:
+            self.show_message(SAVE_FIRST_MESSAGE)
             return
+        from billing import billing_report, date_range
 
-        text = item.text()
-        col = item.column()
-        if table is None:
-            table = self.sender()
-
-        reg_exp = TABLE_REG_EXPRESSIONS[self.tables.index(table)][col]
-
-        if not reg_exp.exactMatch(text):
-            self.item_change_color(item, table, RED, do_reconnect)
-            return False
-
-        if check_unique and col == ID_COLUMN and \
-                [table.item(row, col).text() for row in range(1, table.rowCount())].count(text) > 1:
-            self.item_change_color(item, table, RED, do_reconnect)
-            return False
+        date_from, date_to = self.billing_date_from.text(), self.billing_date_to.text()
+        try:
+            date_range(date_from, date_to)
+        except ValueError:
+            self.show_message(ERROR_MESSAGES.get(DATA_FORMAT_ERROR))
+            return
 
-        if check_foreign_key and table == self.table_conversations and col in (CALLER_ID_COLUMN, CITY_ID_COLUMN):
-            if col == CALLER_ID_COLUMN:
-                linked_table = self.table_callers
-            elif col == CITY_ID_COLUMN:
-                linked_table = self.table_cities
-            else:
-                linked_table = None
-            ids = [linked_table.item(row, ID_COLUMN).text() for row in range(1, linked_table.rowCount())]
-            if text not in ids:
-                self.item_change_color(item, table, RED, do_reconnect)
-                return False
+        task = self.run_task(BILLING_MESSAGE, billing_report, self.base or self.filename, date_from, date_to)
+        if task.cancelled:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_CANCELLED))
+            return
+        if task.error is not None:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{task.error}')
+            return
+        for model, rows in zip(self.billing_models, task.result):
+            model.set_rows(rows)
+        if any(data_table.has_changes() for data_table in self.data_tables):
+            self.statusBar().showMessage(UNSAVED_CHANGES_MESSAGE)
+
+    @instrumented()
+    def action_on_analytics(self):
+        # Read from the rollups of the saved file, like the billing.
+        if self.filename is None:
+            self.show_message(SAVE_FIRST_MESSAGE)
+            return
+        from analytics import analytics_report, month_range
 
-        self.item_change_color(item, table, WHITE, do_reconnect)
-        return True
+        month_from, month_to = self.analytics_month_from.text(), self.analytics_month_to.text()
+        try:
+            month_range(month_from, month_to)
+        except ValueError:
+            self.show_message(ERROR_MESSAGES.get(DATA_FORMAT_ERROR))
+            return
 
-    def item_change_color(self, item, table, color, do_reconnect):
-        if do_reconnect:
-            table.itemChanged.disconnect(self.check_table_value)
-        item.setBackground(color)
-        if do_reconnect:
-            table.itemChanged.connect(self.check_table_value)
+        task = self.run_task(ANALYTICS_MESSAGE, analytics_report, self.base or self.filename, self.analytics_count.value(),
+                             month_from, month_to)
+        if task.cancelled:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_CANCELLED))
+            return
+        if task.error is not None:
+            self.show_message(ERROR_MESSAGES.get(OPERATION_ERROR) + f'{task.error}')
+            return
+        for model, rows in zip(self.analytics_models, task.result):
+            model.set_rows(rows)
+        if any(data_table.has_changes() for data_table in self.data_tables):
+            self.statusBar().showMessage(UNSAVED_CHANGES_MESSAGE)
+
+    @instrumented()
+    def action_on_profile(self, checked):
+        if checked:
+            profiler.enable()
+        else:
+            profiler.disable()
 
+    def action_on_profile_report(self):
+        report = profiler.report()
+        if not report:
+            self.show_message(PROFILE_EMPTY_MESSAGE)
+            return
+        self.show_message('\n'.join(PROFILE_REPORT_LINE.format(*line) for line in report))
+
+    def action_on_profile_save(self):
+        filename, _ = QFileDialog.getSaveFileName(self, 'Сохранить профиль', '',
+                                                  'Статистика cProfile (*.pstats);;Трассировка Chrome (*.json)')
+        if filename:
+            profiler.dump(filename)
+
+    @instrumented()
+    def check_table_value(self, slot, col, old_text, index=None):
+        if index is None:
+            index = self.models.index(self.sender())
+        self.validator.cell_changed(index, slot, col, old_text)
+        self.search_indexes[index].rows_changed([slot])
+        self.models[index].rows_changed([slot])
+        data_table = self.data_tables[index]
+        self.log_edit(JOURNAL_SET, index, data_table.keys[slot], col, data_table.value(slot, col))
+        self.update_cells()
+
+    def update_cells(self):
+        for model, result_model in zip(self.models, self.result_models):
+            model.update_cells()
+            result_model.update_cells()
+
+    def schedule_update_result(self, *_):
+        if self.pending_search is not None and self.pending_search is not self.sender():
+            self.update_result()
+        self.pending_search = self.sender()
+        self.search_timer.start()
+
+    @instrumented()
     def update_result(self, *_, search=None):
         if search is None:
-            search = self.sender()
+            search, self.pending_search = self.pending_search, None
+        if search is None:
+            return
+        self.search_timer.stop()
         index = self.searches.index(search)
-        table = self.tables[index]
-        column_count = table.columnCount()
+        column_count = self.data_tables[index].column_count()
         filters = [search.item(0, col).text() for col in range(column_count)]
 
-        data = [get_table_headers(table)]
-        for row in range(1, table.rowCount()):
-            row_data = [table.item(row, col).text() for col in range(column_count)]
-            if all(string.lower() in text.lower() for text, string in zip(row_data, filters)):
-                data.append(row_data)
-
-        fill_table_with_data(self.results[index], data)
-
-    def edit_table(self, row, col, result=None):
-        if col == 0:
-            return
-
-        if result is None:
-            result = self.sender()
-        index = self.results.index(result)
-        table = self.tables[index]
-        item_id = result.item(row, ID_COLUMN).text()
-        item = result.item(row, col)
-        text = item.text()
+        if self.file_search_enabled():
+            self.query_models[index].set_reader(QueryReader(self.connection, index, filters))
+            add_rows(self.query_models[index].rowCount())
+        else:
+            slots = self.search_indexes[index].search(filters)
+            self.result_models[index].set_result_slots(slots)
+            add_rows(len(slots))
 
-        for row in range(1, table.rowCount()):
-            if table.item(row, ID_COLUMN).text() == item_id:
-                table.item(row, col).setText(text)
+    @instrumented()
+    def edit_table(self, slot, col, old_text, result_model=None):
+        if result_model is None:
+            result_model = self.sender()
+        index = self.result_models.index(result_model)
+        self.check_table_value(slot, col, old_text, index)
 
 
+@instrumented()
 def fill_table_with_data(table, data, with_headers=True):
     table.clear()
     rows, cols = len(data), len(data[0])
+    add_rows(rows)
     table.setRowCount(rows)
     table.setColumnCount(cols)
     font = QFont()
@@ -324,33 +832,15 @@ def fill_table_with_data(table, data, with_headers=True):
                 table.setItem(row, col, QTableWidgetItem(str(data[row][col])))
 
 
-def insert_into_table(row, table, index):
-    default_values = DEFAULT_TABLE_VALUES[index]
-    try:
-        next_id = max(int(table.item(row, 0).text()) for row in range(1, table.rowCount())) + 1
-    except ValueError:
-        next_id = default_values[0]
-    default_values[0] = str(next_id)
-    table.insertRow(row)
-    for col in range(table.columnCount()):
-        table.setItem(row, col, QTableWidgetItem(default_values[col]))
-
-
-def get_table_data(table):
-    return [[table.item(row, col).text() for col in range(table.columnCount())] for row in range(1, table.rowCount())]
-
-
-def get_table_headers(table):
-    return [table.item(0, col).text() for col in range(table.columnCount())]
-
-
 def except_hook(cls, exception, traceback):
     sys.__excepthook__(cls, exception, traceback)
 
 
 if __name__ == '__main__':
+    startup.mark('imports')
     app = QApplication(sys.argv)
     ex = MainWindow()
     ex.show()
+    startup.mark('shown')
     sys.excepthook = except_hook
     sys.exit(app.exec())
@@ -2,7 +2,7 @@
 
 # Form implementation generated from reading ui file 'main_window.ui'
 #
-# Created by: PyQt5 UI code generator 5.15.7
+# Created by: PyQt5 UI code generator 5.15.11
 #
 # WARNING: Any manual changes made to this file will be lost when pyuic5 is
 # run again.  Do not edit this file unless you know what you are doing.
@@ -28,11 +28,9 @@ class Ui_MainWindow(object):
         self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.tab_callers)
         self.verticalLayout_2.setContentsMargins(0, 0, 0, 0)
         self.verticalLayout_2.setObjectName("verticalLayout_2")
-        self.table_callers = QtWidgets.QTableWidget(self.tab_callers)
+        self.table_callers = QtWidgets.QTableView(self.tab_callers)
         self.table_callers.setObjectName("table_callers")
-        self.table_callers.setColumnCount(0)
-        self.table_callers.setRowCount(0)
-        self.table_callers.horizontalHeader().setVisible(False)
+        self.table_callers.horizontalHeader().setVisible(True)
         self.table_callers.horizontalHeader().setDefaultSectionSize(125)
         self.table_callers.verticalHeader().setVisible(False)
         self.verticalLayout_2.addWidget(self.table_callers)
@@ -45,11 +43,9 @@ class Ui_MainWindow(object):
         self.search_callers.horizontalHeader().setDefaultSectionSize(125)
         self.search_callers.verticalHeader().setVisible(False)
         self.verticalLayout_2.addWidget(self.search_callers)
-        self.result_callers = QtWidgets.QTableWidget(self.tab_callers)
+        self.result_callers = QtWidgets.QTableView(self.tab_callers)
         self.result_callers.setObjectName("result_callers")
-        self.result_callers.setColumnCount(0)
-        self.result_callers.setRowCount(0)
-        self.result_callers.horizontalHeader().setVisible(False)
+        self.result_callers.horizontalHeader().setVisible(True)
         self.result_callers.horizontalHeader().setDefaultSectionSize(125)
         self.result_callers.verticalHeader().setVisible(False)
         self.verticalLayout_2.addWidget(self.result_callers)
@@ -59,11 +55,9 @@ class Ui_MainWindow(object):
         self.verticalLayout_3 = QtWidgets.QVBoxLayout(self.tab_cities)
         self.verticalLayout_3.setContentsMargins(0, 0, 0, 0)
         self.verticalLayout_3.setObjectName("verticalLayout_3")
-        self.table_cities = QtWidgets.QTableWidget(self.tab_cities)
+        self.table_cities = QtWidgets.QTableView(self.tab_cities)
         self.table_cities.setObjectName("table_cities")
-        self.table_cities.setColumnCount(0)
-        self.table_cities.setRowCount(0)
-        self.table_cities.horizontalHeader().setVisible(False)
+        self.table_cities.horizontalHeader().setVisible(True)
         self.table_cities.horizontalHeader().setDefaultSectionSize(125)
         self.table_cities.verticalHeader().setVisible(False)
         self.verticalLayout_3.addWidget(self.table_cities)
@@ -76,11 +70,9 @@ class Ui_MainWindow(object):
         self.search_cities.horizontalHeader().setDefaultSectionSize(125)
         self.search_cities.verticalHeader().setVisible(False)
         self.verticalLayout_3.addWidget(self.search_cities)
-        self.result_cities = QtWidgets.QTableWidget(self.tab_cities)
+        self.result_cities = QtWidgets.QTableView(self.tab_cities)
         self.result_cities.setObjectName("result_cities")
-        self.result_cities.setColumnCount(0)
-        self.result_cities.setRowCount(0)
-        self.result_cities.horizontalHeader().setVisible(False)
+        self.result_cities.horizontalHeader().setVisible(True)
         self.result_cities.horizontalHeader().setDefaultSectionSize(125)
         self.result_cities.verticalHeader().setVisible(False)
         self.verticalLayout_3.addWidget(self.result_cities)
@@ -90,11 +82,9 @@ class Ui_MainWindow(object):
         self.verticalLayout_4 = QtWidgets.QVBoxLayout(self.tab_conversations)
         self.verticalLayout_4.setContentsMargins(0, 0, 0, 0)
         self.verticalLayout_4.setObjectName("verticalLayout_4")
-        self.table_conversations = QtWidgets.QTableWidget(self.tab_conversations)
+        self.table_conversations = QtWidgets.QTableView(self.tab_conversations)
         self.table_conversations.setObjectName("table_conversations")
-        self.table_conversations.setColumnCount(0)
-        self.table_conversations.setRowCount(0)
-        self.table_conversations.horizontalHeader().setVisible(False)
+        self.table_conversations.horizontalHeader().setVisible(True)
         self.table_conversations.horizontalHeader().setDefaultSectionSize(125)
         self.table_conversations.verticalHeader().setVisible(False)
         self.verticalLayout_4.addWidget(self.table_conversations)
@@ -107,15 +97,104 @@ class Ui_MainWindow(object):
         self.search_conversations.horizontalHeader().setDefaultSectionSize(125)
         self.search_conversations.verticalHeader().setVisible(False)
         self.verticalLayout_4.addWidget(self.search_conversations)
-        self.result_conversations = QtWidgets.QTableWidget(self.tab_conversations)
+        self.result_conversations = QtWidgets.QTableView(self.tab_conversations)
         self.result_conversations.setObjectName("result_conversations")
-        self.result_conversations.setColumnCount(0)
-        self.result_conversations.setRowCount(0)
-        self.result_conversations.horizontalHeader().setVisible(False)
+        self.result_conversations.horizontalHeader().setVisible(True)
         self.result_conversations.horizontalHeader().setDefaultSectionSize(125)
         self.result_conversations.verticalHeader().setVisible(False)
         self.verticalLayout_4.addWidget(self.result_conversations)
         self.tab_widget.addTab(self.tab_conversations, "")
+        self.tab_billing = QtWidgets.QWidget()
+        self.tab_billing.setObjectName("tab_billing")
+        self.verticalLayout_5 = QtWidgets.QVBoxLayout(self.tab_billing)
+        self.verticalLayout_5.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_5.setObjectName("verticalLayout_5")
+        self.billing_layout = QtWidgets.QHBoxLayout()
+        self.billing_layout.setObjectName("billing_layout")
+        self.billing_from_label = QtWidgets.QLabel(self.tab_billing)
+        self.billing_from_label.setObjectName("billing_from_label")
+        self.billing_layout.addWidget(self.billing_from_label)
+        self.billing_date_from = QtWidgets.QLineEdit(self.tab_billing)
+        self.billing_date_from.setObjectName("billing_date_from")
+        self.billing_layout.addWidget(self.billing_date_from)
+        self.billing_to_label = QtWidgets.QLabel(self.tab_billing)
+        self.billing_to_label.setObjectName("billing_to_label")
+        self.billing_layout.addWidget(self.billing_to_label)
+        self.billing_date_to = QtWidgets.QLineEdit(self.tab_billing)
+        self.billing_date_to.setObjectName("billing_date_to")
+        self.billing_layout.addWidget(self.billing_date_to)
+        self.billing_button = QtWidgets.QPushButton(self.tab_billing)
+        self.billing_button.setObjectName("billing_button")
+        self.billing_layout.addWidget(self.billing_button)
+        spacerItem = QtWidgets.QSpacerItem(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.billing_layout.addItem(spacerItem)
+        self.verticalLayout_5.addLayout(self.billing_layout)
+        self.billing_callers = QtWidgets.QTableView(self.tab_billing)
+        self.billing_callers.setObjectName("billing_callers")
+        self.billing_callers.horizontalHeader().setVisible(True)
+        self.billing_callers.horizontalHeader().setDefaultSectionSize(125)
+        self.billing_callers.verticalHeader().setVisible(False)
+        self.verticalLayout_5.addWidget(self.billing_callers)
+        self.billing_cities = QtWidgets.QTableView(self.tab_billing)
+        self.billing_cities.setObjectName("billing_cities")
+        self.billing_cities.horizontalHeader().setVisible(True)
+        self.billing_cities.horizontalHeader().setDefaultSectionSize(125)
+        self.billing_cities.verticalHeader().setVisible(False)
+        self.verticalLayout_5.addWidget(self.billing_cities)
+        self.tab_widget.addTab(self.tab_billing, "")
+        self.tab_analytics = QtWidgets.QWidget()
+        self.tab_analytics.setObjectName("tab_analytics")
+        self.verticalLayout_6 = QtWidgets.QVBoxLayout(self.tab_analytics)
+        self.verticalLayout_6.setContentsMargins(0, 0, 0, 0)
+        self.verticalLayout_6.setObjectName("verticalLayout_6")
+        self.analytics_layout = QtWidgets.QHBoxLayout()
+        self.analytics_layout.setObjectName("analytics_layout")
+        self.analytics_count_label = QtWidgets.QLabel(self.tab_analytics)
+        self.analytics_count_label.setObjectName("analytics_count_label")
+        self.analytics_layout.addWidget(self.analytics_count_label)
+        self.analytics_count = QtWidgets.QSpinBox(self.tab_analytics)
+        self.analytics_count.setMinimum(1)
+        self.analytics_count.setMaximum(10000)
+        self.analytics_count.setProperty("value", 20)
+        self.analytics_count.setObjectName("analytics_count")
+        self.analytics_layout.addWidget(self.analytics_count)
+        self.analytics_from_label = QtWidgets.QLabel(self.tab_analytics)
+        self.analytics_from_label.setObjectName("analytics_from_label")
+        self.analytics_layout.addWidget(self.analytics_from_label)
+        self.analytics_month_from = QtWidgets.QLineEdit(self.tab_analytics)
+        self.analytics_month_from.setObjectName("analytics_month_from")
+        self.analytics_layout.addWidget(self.analytics_month_from)
+        self.analytics_to_label = QtWidgets.QLabel(self.tab_analytics)
+        self.analytics_to_label.setObjectName("analytics_to_label")
+        self.analytics_layout.addWidget(self.analytics_to_label)
+        self.analytics_month_to = QtWidgets.QLineEdit(self.tab_analytics)
+        self.analytics_month_to.setObjectName("analytics_month_to")
+        self.analytics_layout.addWidget(self.analytics_month_to)
+        self.analytics_button = QtWidgets.QPushButton(self.tab_analytics)
+        self.analytics_button.setObjectName("analytics_button")
+        self.analytics_layout.addWidget(self.analytics_button)
+        spacerItem1 = QtWidgets.QSpacerItem(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.analytics_layout.addItem(spacerItem1)
+        self.verticalLayout_6.addLayout(self.analytics_layout)
+        self.analytics_callers = QtWidgets.QTableView(self.tab_analytics)
+        self.analytics_callers.setObjectName("analytics_callers")
+        self.analytics_callers.horizontalHeader().setVisible(True)
+        self.analytics_callers.horizontalHeader().setDefaultSectionSize(125)
+        self.analytics_callers.verticalHeader().setVisible(False)
+        self.verticalLayout_6.addWidget(self.analytics_callers)
+        self.analytics_cities = QtWidgets.QTableView(self.tab_analytics)
+        self.analytics_cities.setObjectName("analytics_cities")
+        self.analytics_cities.horizontalHeader().setVisible(True)
+        self.analytics_cities.horizontalHeader().setDefaultSectionSize(125)
+        self.analytics_cities.verticalHeader().setVisible(False)
+        self.verticalLayout_6.addWidget(self.analytics_cities)
+        self.analytics_months = QtWidgets.QTableView(self.tab_analytics)
+        self.analytics_months.setObjectName("analytics_months")
+        self.analytics_months.horizontalHeader().setVisible(True)
+        self.analytics_months.horizontalHeader().setDefaultSectionSize(125)
+        self.analytics_months.verticalHeader().setVisible(False)
+        self.verticalLayout_6.addWidget(self.analytics_months)
+        self.tab_widget.addTab(self.tab_analytics, "")
         self.verticalLayout.addWidget(self.tab_widget)
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
@@ -125,6 +204,8 @@ class Ui_MainWindow(object):
         self.menu.setObjectName("menu")
         self.menu_2 = QtWidgets.QMenu(self.menubar)
         self.menu_2.setObjectName("menu_2")
+        self.menu_3 = QtWidgets.QMenu(self.menubar)
+        self.menu_3.setObjectName("menu_3")
         MainWindow.setMenuBar(self.menubar)
         self.action_new = QtWidgets.QAction(MainWindow)
         self.action_new.setObjectName("action_new")
@@ -134,6 +215,10 @@ class Ui_MainWindow(object):
         self.action_save.setObjectName("action_save")
         self.action_save_as = QtWidgets.QAction(MainWindow)
         self.action_save_as.setObjectName("action_save_as")
+        self.action_import = QtWidgets.QAction(MainWindow)
+        self.action_import.setObjectName("action_import")
+        self.action_export = QtWidgets.QAction(MainWindow)
+        self.action_export.setObjectName("action_export")
         self.action_exit = QtWidgets.QAction(MainWindow)
         self.action_exit.setObjectName("action_exit")
         self.action_insert = QtWidgets.QAction(MainWindow)
@@ -145,18 +230,36 @@ class Ui_MainWindow(object):
         self.action_search = QtWidgets.QAction(MainWindow)
         self.action_search.setCheckable(True)
         self.action_search.setObjectName("action_search")
+        self.action_search_file = QtWidgets.QAction(MainWindow)
+        self.action_search_file.setCheckable(True)
+        self.action_search_file.setObjectName("action_search_file")
+        self.action_profile = QtWidgets.QAction(MainWindow)
+        self.action_profile.setCheckable(True)
+        self.action_profile.setObjectName("action_profile")
+        self.action_profile_report = QtWidgets.QAction(MainWindow)
+        self.action_profile_report.setObjectName("action_profile_report")
+        self.action_profile_save = QtWidgets.QAction(MainWindow)
+        self.action_profile_save.setObjectName("action_profile_save")
         self.menu.addAction(self.action_new)
         self.menu.addAction(self.action_open)
         self.menu.addSeparator()
         self.menu.addAction(self.action_save)
         self.menu.addSeparator()
+        self.menu.addAction(self.action_import)
+        self.menu.addAction(self.action_export)
+        self.menu.addSeparator()
         self.menu.addAction(self.action_exit)
         self.menu_2.addAction(self.action_add)
         self.menu_2.addAction(self.action_delete)
         self.menu_2.addSeparator()
         self.menu_2.addAction(self.action_search)
+        self.menu_2.addAction(self.action_search_file)
+        self.menu_3.addAction(self.action_profile)
+        self.menu_3.addAction(self.action_profile_report)
+        self.menu_3.addAction(self.action_profile_save)
         self.menubar.addAction(self.menu.menuAction())
         self.menubar.addAction(self.menu_2.menuAction())
+        self.menubar.addAction(self.menu_3.menuAction())
 
         self.retranslateUi(MainWindow)
         self.tab_widget.setCurrentIndex(0)
@@ -167,14 +270,34 @@ class Ui_MainWindow(object):
         self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_callers), _translate("MainWindow", "Абоненты"))
         self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_cities), _translate("MainWindow", "Города"))
         self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_conversations), _translate("MainWindow", "Переговоры"))
+        self.billing_from_label.setText(_translate("MainWindow", "Период с"))
+        self.billing_date_from.setPlaceholderText(_translate("MainWindow", "дд.мм.гггг"))
+        self.billing_to_label.setText(_translate("MainWindow", "по"))
+        self.billing_date_to.setPlaceholderText(_translate("MainWindow", "дд.мм.гггг"))
+        self.billing_button.setText(_translate("MainWindow", "Рассчитать"))
+        self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_billing), _translate("MainWindow", "Расчёт"))
+        self.analytics_count_label.setText(_translate("MainWindow", "Абонентов"))
+        self.analytics_from_label.setText(_translate("MainWindow", "Месяцы с"))
+        self.analytics_month_from.setPlaceholderText(_translate("MainWindow", "мм.гггг"))
+        self.analytics_to_label.setText(_translate("MainWindow", "по"))
+        self.analytics_month_to.setPlaceholderText(_translate("MainWindow", "мм.гггг"))
+        self.analytics_button.setText(_translate("MainWindow", "Обновить"))
+        self.tab_widget.setTabText(self.tab_widget.indexOf(self.tab_analytics), _translate("MainWindow", "Сводка"))
         self.menu.setTitle(_translate("MainWindow", "Файл"))
         self.menu_2.setTitle(_translate("MainWindow", "Правка"))
+        self.menu_3.setTitle(_translate("MainWindow", "Сервис"))
         self.action_new.setText(_translate("MainWindow", "Новый..."))
         self.action_open.setText(_translate("MainWindow", "Открыть..."))
         self.action_save.setText(_translate("MainWindow", "Сохранить"))
         self.action_save_as.setText(_translate("MainWindow", "Сохранить как..."))
+        self.action_import.setText(_translate("MainWindow", "Импорт..."))
+        self.action_export.setText(_translate("MainWindow", "Экспорт..."))
         self.action_exit.setText(_translate("MainWindow", "Выход"))
         self.action_insert.setText(_translate("MainWindow", "Вставить строку"))
         self.action_add.setText(_translate("MainWindow", "Добавить строку"))
         self.action_delete.setText(_translate("MainWindow", "Удалить строку"))
         self.action_search.setText(_translate("MainWindow", "Искать в таблице"))
+        self.action_search_file.setText(_translate("MainWindow", "Искать в файле"))
+        self.action_profile.setText(_translate("MainWindow", "Профилирование"))
+        self.action_profile_report.setText(_translate("MainWindow", "Статистика профилирования"))
+        self.action_profile_save.setText(_translate("MainWindow", "Сохранить профиль..."))
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+from consts import PARTITION_PERIODS, PARTITION_FILE, DB_PARTITION_CREATE_REQUESTS, DB_PERIODS_REQUEST, \
+    DB_SPLIT_COPY_REQUEST, DB_SPLIT_DELETE_REQUEST, DB_PARTITION_STATS_REQUEST, DB_SAVE_PARTITION_REQUEST, \
+    DB_ROLLUP_TRIGGER_REQUESTS, DB_ROLLUP_DROP_TRIGGER_REQUESTS, DB_CHANGE_TRIGGER_REQUESTS, \
+    DB_CHANGE_DROP_TRIGGER_REQUESTS, DB_RESET_CHANGES_REQUESTS, DB_SAVE_PARTITION_REFERENCES_REQUESTS
+from database import connect, schema_name, OperationCancelled
+from profiling import instrumented, add_rows
+
+
+def period_bounds(name):
+    # yyyy or yyyy-mm -> the first and the last date key of the period.
+    pad = '-00' * ((10 - len(name)) // 3)
+    return name + pad, name + pad.replace('0', '9')
+
+
+def partition_filename(filename, name):
+    # data.db -> data.2023.db, next to the file.
+    directory, base = os.path.split(filename)
+    return os.path.join(directory, PARTITION_FILE.format(os.path.splitext(base)[0], name))
+
+
+def move_period(connection, filename, name):
+    # The rows of the period are copied into its partition and committed
+    # there first, then deleted from the file together with the update of
+    # `partitions`. The two files do not commit at once: if the second step
+    # does not happen, the rows are in both, and splitting again finishes
+    # the move (the copy skips rows the partition already has).
+    first, last = period_bounds(name)
+    path = partition_filename(filename, name)
+    schema = schema_name(name)
+    connection.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for request in DB_PARTITION_CREATE_REQUESTS[:-1]:
+                connection.execute(request.format(schema))
+            connection.execute(DB_PARTITION_CREATE_REQUESTS[-1].format(schema), (os.path.basename(filename), name))
+            connection.execute(DB_SPLIT_COPY_REQUEST.format(schema), (first, last))
+            connection.execute('COMMIT')
+
+            # The rows leave the file, not the history: the rollups keep
+            # them and nobody has to reread a deleted row, so the triggers
+            # are off while they are deleted.
+            connection.execute('BEGIN IMMEDIATE')
+            for request in DB_ROLLUP_DROP_TRIGGER_REQUESTS + DB_CHANGE_DROP_TRIGGER_REQUESTS:
+                connection.execute(request)
+            count = connection.execute(DB_SPLIT_DELETE_REQUEST, (first, last)).rowcount
+            for request in DB_ROLLUP_TRIGGER_REQUESTS + DB_CHANGE_TRIGGER_REQUESTS:
+                connection.execute(request)
+            rows, first_date, last_date, max_id = connection.execute(
+                DB_PARTITION_STATS_REQUEST.format(schema)).fetchone()
+            connection.execute(DB_SAVE_PARTITION_REQUEST,
+                               (name, os.path.basename(path), first_date, last_date, rows, max_id))
+            for request in DB_SAVE_PARTITION_REFERENCES_REQUESTS:
+                connection.execute(request.format(schema))
+            connection.execute('COMMIT')
+        except (sqlite3.Error, OperationCancelled):
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+    finally:
+        connection.execute(f'DETACH DATABASE {schema}')
+    add_rows(count)
+    return count, path
+
+
+@instrumented()
+def split_file(filename, by='year', task=None):
+    # Moves the conversations of every period but the last one into
+    # partitions; returns (period, rows moved, partition file) for each.
+    # Windows that have the file open reread it, as the change log is
+    # reset to tell them that any row may have changed.
+    connection = connect(filename, isolation_level=None)
+    try:
+        names = [name for name, in connection.execute(DB_PERIODS_REQUEST, (PARTITION_PERIODS[by],))][:-1]
+        moved = []
+        for i, name in enumerate(names):
+            if task is not None:
+                if task.is_cancelled():
+                    raise OperationCancelled
+                task.report(i, len(names))
+            moved.append((name, *move_period(connection, filename, name)))
+        if moved:
+            connection.execute('BEGIN IMMEDIATE')
+            for request in DB_RESET_CHANGES_REQUESTS:
+                connection.execute(request)
+            connection.execute('COMMIT')
+        return moved
+    finally:
+        connection.close()
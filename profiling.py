@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from consts import PROFILE_ENVIRONMENT, PROFILE_SLOW_ENVIRONMENT, SLOW_OPERATION_TIME, MAX_TRACE_EVENTS, \
+    STARTUP_REPORT_LINE
+
+# inspect.CO_VARARGS; inspect itself is slow to import and only this flag
+# is needed from it.
+CO_VARARGS = 0x04
+
+
+class Profiler:
+    # Wall time, call and row counts of instrumented functions, a ring of
+    # Chrome trace events and a cProfile of the GUI thread. Nothing is
+    # recorded while it is disabled.
+    def __init__(self):
+        self.enabled = False
+        self.slow_time = SLOW_OPERATION_TIME
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profile = None
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self.events = deque(maxlen=MAX_TRACE_EVENTS)
+        self.start_time = time.perf_counter()
+
+    def enable(self):
+        if self.enabled:
+            return
+        import cProfile
+
+        self.reset()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.profile.disable()
+
+    def call(self, name, rows, function, args, kwargs):
+        stack = self.local.__dict__.setdefault('stack', [])
+        frame = [0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+            if rows is not None:
+                frame[0] += rows(result)
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.record(name, start, duration, frame[0])
+
+    def add_rows(self, count):
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            stack[-1][0] += count
+
+    def record(self, name, start, duration, rows):
+        with self.lock:
+            stats = self.stats.setdefault(name, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            stats[3] += rows
+            self.events.append((name, start, duration, rows, threading.get_ident()))
+        if duration >= self.slow_time:
+            import logging
+
+            logging.getLogger(__name__).warning('%s: %.1f ms, %d rows', name, duration * 1000, rows)
+
+    def report(self):
+        # name, calls, total ms, max ms, rows; the slowest first.
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)
+        return [(name, calls, total * 1000, longest * 1000, rows) for name, (calls, total, longest, rows) in stats]
+
+    def dump(self, filename):
+        # *.json is written as a Chrome trace (chrome://tracing, Perfetto),
+        # anything else as a pstats file of the cProfile data.
+        if filename.endswith('.json'):
+            import json
+
+            with self.lock:
+                events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': thread,
+                           'ts': (start - self.start_time) * 1e6, 'dur': duration * 1e6, 'args': {'rows': rows}}
+                          for name, start, duration, rows, thread in self.events]
+            with open(filename, 'w', encoding='utf-8') as file:
+                json.dump({'traceEvents': events}, file)
+        elif self.profile is not None:
+            self.profile.create_stats()
+            self.profile.dump_stats(filename)
+            if self.enabled:
+                self.profile.enable()
+
+
+class StartupTimer:
+    # Steps of the start of the window, timed from the import of this module,
+    # which is the first thing main.py imports.
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.steps = []
+
+    def mark(self, name):
+        self.steps.append((name, time.perf_counter()))
+
+    def report(self):
+        return '\n'.join(STARTUP_REPORT_LINE.format(name, (step_time - self.start_time) * 1000)
+                         for name, step_time in self.steps)
+
+
+startup = StartupTimer()
+profiler = Profiler()
+if os.environ.get(PROFILE_ENVIRONMENT):
+    profiler.slow_time = float(os.environ.get(PROFILE_SLOW_ENVIRONMENT, SLOW_OPERATION_TIME * 1000)) / 1000
+    profiler.enable()
+
+
+def instrumented(name=None, rows=None):
+    # Records every call of the function while the profiler is enabled;
+    # rows(result) or profiler.add_rows() give the number of rows handled.
+    def decorator(function):
+        label = name or function.__qualname__
+        # Qt drops the signal arguments a slot does not take; the wrapper
+        # takes any, so it drops them itself.
+        code = function.__code__
+        max_args = None if code.co_flags & CO_VARARGS else code.co_argcount
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if max_args is not None and len(args) > max_args:
+                args = args[:max_args]
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            return profiler.call(label, rows, function, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def add_rows(count):
+    if profiler.enabled:
+        profiler.add_rows(count)
@@ -0,0 +1,192 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from filters import parse_filter, column_key, MISSING, MIN_KEY
+from consts import COLUMN_TYPES, PREDICATE_EXACT, PREDICATE_RANGE, PREDICATE_SUBSTRING
+
+SEPARATOR = '\x00'
+REBUILD_FRACTION = 64
+DENSE_FRACTION = 16
+
+
+class ColumnIndex:
+    # Lowercased cells of one column and the same cells joined into one
+    # string, which str.find scans at C speed. Cells changed after the join
+    # are kept in `dirty` and checked one by one until the next rebuild.
+    def __init__(self, texts):
+        self.texts = texts
+        self.build_blob()
+
+    def build_blob(self):
+        self.blob = SEPARATOR.join(self.texts)
+        self.starts = array('q', accumulate((len(text) + 1 for text in self.texts), initial=0))
+        self.size = len(self.texts)
+        self.dirty = set()
+
+    def update(self, slot, text):
+        text = text.lower() if text is not None else SEPARATOR
+        if slot < len(self.texts):
+            self.texts[slot] = text
+        else:
+            self.texts.append(text)
+        if slot < self.size:
+            self.dirty.add(slot)
+
+    def find(self, needle):
+        if len(self.dirty) + len(self.texts) - self.size > self.size // REBUILD_FRACTION:
+            self.build_blob()
+
+        texts = self.texts
+        if self.blob.count(needle) > self.size // DENSE_FRACTION:
+            return [slot for slot, text in enumerate(texts) if needle in text]
+
+        blob, starts, dirty = self.blob, self.starts, self.dirty
+        slots = []
+        pos = blob.find(needle)
+        while pos != -1:
+            slot = bisect_right(starts, pos) - 1
+            if slot not in dirty:
+                slots.append(slot)
+            if slot + 1 >= self.size:
+                break
+            pos = blob.find(needle, starts[slot + 1])
+        slots.extend(slot for slot in dirty if needle in texts[slot])
+        slots.extend(slot for slot in range(self.size, len(texts)) if needle in texts[slot])
+        slots.sort()
+        return slots
+
+
+class SortedIndex:
+    # Slots ordered by the integer key of one column (a number or a date
+    # ordinal), so the slots of a range are found with two bisections.
+    # Changed slots are kept in `dirty` and checked one by one until the
+    # next rebuild.
+    def __init__(self, values, key):
+        self.key = key
+        self.values = values
+        self.build()
+
+    def build(self):
+        values = self.values
+        self.slots = array('q', sorted(range(len(values)), key=values.__getitem__))
+        self.keys = array('q', (values[slot] for slot in self.slots))
+        self.size = len(values)
+        self.dirty = set()
+
+    def update(self, slot, text):
+        value = self.key(text) if text is not None else MISSING
+        if slot < len(self.values):
+            self.values[slot] = value
+        else:
+            self.values.append(value)
+        if slot < self.size:
+            self.dirty.add(slot)
+
+    def find_range(self, first, last):
+        if len(self.dirty) + len(self.values) - self.size > self.size // REBUILD_FRACTION:
+            self.build()
+
+        first = max(first, MIN_KEY)
+        values, dirty = self.values, self.dirty
+        found = self.slots[bisect_left(self.keys, first):bisect_right(self.keys, last)]
+        slots = [slot for slot in found if slot not in dirty] if dirty else found.tolist()
+        slots.extend(slot for slot in dirty if first <= values[slot] <= last)
+        slots.extend(slot for slot in range(self.size, len(values)) if first <= values[slot] <= last)
+        slots.sort()
+        return slots
+
+
+class SearchIndex:
+    # Search over one table by the predicates of filters.parse_filter().
+    # Ranges resolve through sorted column indexes and substrings through
+    # the joined column texts; both are built on the first filter typed
+    # into their column. The slot lists found are intersected and the
+    # remaining predicates are checked on what is left. A filter that only
+    # narrows the previous one rechecks the previous result.
+    def __init__(self, data_table):
+        self.data_table = data_table
+        self.column_types = COLUMN_TYPES[data_table.index]
+        self.reset()
+
+    def reset(self):
+        self.columns = {}
+        self.sorted_columns = {}
+        self.last_predicates = None
+        self.last_slots = None
+
+    def column(self, col):
+        if col not in self.columns:
+            self.columns[col] = ColumnIndex(self.data_table.lower_texts(col, SEPARATOR))
+        return self.columns[col]
+
+    def sorted_column(self, col):
+        if col not in self.sorted_columns:
+            key = column_key(self.column_types[col])
+            self.sorted_columns[col] = SortedIndex(self.data_table.column_keys(col, key, MISSING), key)
+        return self.sorted_columns[col]
+
+    def rows_changed(self, slots):
+        self.last_predicates = self.last_slots = None
+        data_table = self.data_table
+        for col, column in (*self.columns.items(), *self.sorted_columns.items()):
+            for slot in slots:
+                column.update(slot, data_table.value(slot, col) if data_table.state[slot] else None)
+
+    def find_range(self, col, first, last):
+        return self.sorted_column(col).find_range(first, last)
+
+    def search(self, filters):
+        predicates = [parse_filter(string, column_type) if string else None
+                      for string, column_type in zip(filters, self.column_types)]
+        active = [(col, predicate) for col, predicate in enumerate(predicates) if predicate is not None]
+        if not active:
+            self.last_predicates = self.last_slots = None
+            return self.data_table.order[:]
+
+        if self.last_slots is not None and all(map(narrows, self.last_predicates, predicates)):
+            slots = self.last_slots
+            checks = [(col, predicate) for col, predicate in active if predicate != self.last_predicates[col]]
+        else:
+            found = [self.find_range(col, *predicate[1:])
+                     for col, predicate in active if predicate[0] == PREDICATE_RANGE]
+            texts = [(col, predicate) for col, predicate in active if predicate[0] != PREDICATE_RANGE]
+            checks = []
+            if texts:
+                col, predicate = max(texts, key=lambda item: len(item[1][1]))
+                found.append(self.column(col).find(predicate[1]))
+                checks = [(other_col, other) for other_col, other in texts
+                          if other_col != col or other[0] == PREDICATE_EXACT]
+            found.sort(key=len)
+            slots = found[0]
+            for other in found[1:]:
+                other = set(other)
+                slots = [slot for slot in slots if slot in other]
+
+        for col, predicate in checks:
+            slots = self.check(slots, col, predicate)
+
+        self.last_predicates, self.last_slots = predicates, slots
+        return slots
+
+    def check(self, slots, col, predicate):
+        kind = predicate[0]
+        if kind == PREDICATE_RANGE:
+            values, first, last = self.sorted_column(col).values, *predicate[1:]
+            return [slot for slot in slots if first <= values[slot] <= last]
+        texts, text = self.column(col).texts, predicate[1]
+        if kind == PREDICATE_EXACT:
+            return [slot for slot in slots if texts[slot] == text]
+        return [slot for slot in slots if text in texts[slot]]
+
+
+def narrows(old, new):
+    # True if every row matching `new` also matches `old`.
+    if old is None or old == new:
+        return True
+    if new is None or old[0] != new[0]:
+        return False
+    if old[0] == PREDICATE_SUBSTRING:
+        return old[1] in new[1]
+    if old[0] == PREDICATE_RANGE:
+        return old[1] <= new[1] and new[2] <= old[2]
+    return False
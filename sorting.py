@@ -0,0 +1,105 @@
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from columns import put
+from filters import column_key, MISSING
+from consts import COLUMN_TYPES
+
+# Rows added at once up to this many are inserted into the sorted rows one
+# by one; more are merged in with a new sort.
+MAX_INSERTED_ROWS = 256
+
+
+def collation_key(text):
+    # Texts sort case-insensitively, with ё among е as in a dictionary.
+    return text.casefold().replace('ё', 'е')
+
+
+class TableSorter:
+    # The rows of a table in the order of one column. The keys of the column
+    # are computed once for every slot and kept in `keys`: numbers and dates
+    # as integers (filters.column_key(), cells that are neither come first),
+    # texts as collation keys. `slots` holds the rows ordered by (key, slot),
+    # so rows with equal keys keep their order and the place of a slot is
+    # found by bisection with its key. A descending sort is the same order
+    # read from the end by the models, so sorting the same column again
+    # costs nothing, and rows that are edited, added or deleted are moved
+    # one at a time: the order is not sorted anew while the column stays.
+    def __init__(self, data_table):
+        self.data_table = data_table
+        self.column_types = COLUMN_TYPES[data_table.index]
+        self.reset()
+
+    def reset(self):
+        self.col = None
+        self.key = None
+        self.keys = None
+        self.slots = array('i')
+
+    def is_active(self):
+        return self.col is not None
+
+    def sort(self, col):
+        if col != self.col:
+            key = column_key(self.column_types[col])
+            if key is None:
+                key = collation_key
+                self.keys = self.data_table.text_keys(col, key)
+            else:
+                self.keys = self.data_table.column_keys(col, key, MISSING)
+            self.col, self.key = col, key
+            self.slots = array('i')
+            self.slots.fromlist(sorted(self.data_table.order, key=self.sort_keys().__getitem__))
+
+    def sort_keys(self):
+        # The keys as a list, which sorted() reads faster than an array.
+        return self.keys if isinstance(self.keys, list) else self.keys.tolist()
+
+    def sort_key(self, slot):
+        return self.keys[slot], slot
+
+    def sorted_slots(self, slots):
+        # Some of the rows, as a list in the order of the column; for all of
+        # them the sorted rows are copied.
+        if len(slots) == len(self.slots):
+            return self.slots.tolist()
+        return sorted(sorted(slots), key=self.sort_keys().__getitem__)
+
+    def update_key(self, slot):
+        keys = self.keys
+        for new_slot in range(len(keys), slot):
+            keys = put(keys, new_slot, self.key(self.data_table.value(new_slot, self.col)))
+        self.keys = put(keys, slot, self.key(self.data_table.value(slot, self.col)))
+
+    def find(self, slot):
+        # Index of `slot` in `slots` by the key it was sorted with, -1 if it
+        # is not there.
+        slots = self.slots
+        if slot >= len(self.keys):
+            return -1
+        i = bisect_left(slots, self.sort_key(slot), key=self.sort_key)
+        return i if i < len(slots) and slots[i] == slot else -1
+
+    def insertion(self, slot):
+        # Where `slot` goes by its current key.
+        self.update_key(slot)
+        return bisect_left(self.slots, self.sort_key(slot), key=self.sort_key)
+
+    def new_index(self, i):
+        # Where the slot at `i` goes after its key was updated, counted
+        # without it.
+        slots, key = self.slots, self.sort_key(self.slots[i])
+        if i > 0 and key < self.sort_key(slots[i - 1]):
+            return bisect_left(slots, key, 0, i, key=self.sort_key)
+        if i + 1 < len(slots) and self.sort_key(slots[i + 1]) < key:
+            return bisect_left(slots, key, i + 1, len(slots), key=self.sort_key) - 1
+        return i
+
+    def merge(self, slots):
+        # Adds many new slots at once; they come after every slot there is,
+        # so a stable sort keeps the order of equal keys.
+        for slot in slots:
+            self.update_key(slot)
+        merged = array('i')
+        merged.fromlist(sorted(chain(self.slots, slots), key=self.sort_keys().__getitem__))
+        self.slots = merged
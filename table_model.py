@@ -0,0 +1,273 @@
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from consts import RED, WHITE
+from data_store import position
+from sorting import MAX_INSERTED_ROWS
+
+WHITE_BRUSH = QBrush(QColor(WHITE))
+RED_BRUSH = QBrush(QColor(RED))
+
+
+class TableModel(QAbstractTableModel):
+    # The rows of a DataTable, or the slots of a search result, in the order
+    # of the table or, once sort() was called, in the order of a column kept
+    # by a TableSorter shared by both models of the table.
+    cellEdited = pyqtSignal(int, int, str)
+    rowsFetched = pyqtSignal(int, int)
+
+    def __init__(self, table, sorter=None, is_result=False):
+        super().__init__()
+        self.table = table
+        self.sorter = sorter
+        self.result_slots = [] if is_result else None
+        self.descending = False
+        self.read_only = False
+
+    def is_sorted(self):
+        return self.sorter is not None and self.sorter.is_active()
+
+    def slots(self):
+        # Slots by row, read from the end for a descending sort.
+        if self.result_slots is not None:
+            return self.result_slots
+        return self.sorter.slots if self.is_sorted() else self.table.order
+
+    def display_row(self, i, count):
+        # The row of the item at `i` of slots() of length `count`.
+        return count - 1 - i if self.descending and self.is_sorted() else i
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.slots())
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.table.column_count()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        slot = self.slot(index.row())
+        col = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.table.value(slot, col)
+        if role == Qt.BackgroundRole:
+            return RED_BRUSH if (slot, col) in self.table.invalid else WHITE_BRUSH
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        slot = self.slot(index.row())
+        col = index.column()
+        old_text = self.table.value(slot, col)
+        self.table.set_value(slot, col, str(value))
+        self.cellEdited.emit(slot, col, old_text)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.table.headers[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.result_slots is None and self.table.can_fetch_more()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self.add_fetched_rows(self.table.source.fetch())
+
+    def fetch_all(self):
+        if self.canFetchMore():
+            self.add_fetched_rows(self.table.source.fetch_all())
+
+    def add_fetched_rows(self, data):
+        if not data:
+            return
+        if self.is_sorted():
+            slots = self.table.extend(data)
+            self.insert_sorted(slots)
+        else:
+            row = self.rowCount()
+            self.beginInsertRows(QModelIndex(), row, row + len(data) - 1)
+            slots = self.table.extend(data)
+            self.endInsertRows()
+        self.rowsFetched.emit(slots.start, slots.stop)
+
+    def insert_sorted(self, slots):
+        # New slots of the table, which are not in the sorted rows yet.
+        if len(slots) > MAX_INSERTED_ROWS:
+            self.beginResetModel()
+            self.sorter.merge(slots)
+            self.endResetModel()
+            return
+        for slot in slots:
+            i = self.sorter.insertion(slot)
+            row = self.display_row(i, self.rowCount() + 1)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.sorter.slots.insert(i, slot)
+            self.endInsertRows()
+
+    def rows_changed(self, slots):
+        # Rows whose cells were changed move to where their new keys sort.
+        if not self.is_sorted() or self.result_slots is not None:
+            return
+        sorter = self.sorter
+        for slot in slots:
+            i = sorter.find(slot)
+            sorter.update_key(slot)
+            if i == -1:
+                continue
+            new_i = sorter.new_index(i)
+            if new_i == i:
+                continue
+            count = self.rowCount()
+            row, new_row = self.display_row(i, count), self.display_row(new_i, count)
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), new_row if new_row < row else new_row + 1)
+            del sorter.slots[i]
+            sorter.slots.insert(new_i, slot)
+            self.endMoveRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Rows that are selected or current stay so at their new places.
+        if self.sorter is None:
+            return
+        self.layoutAboutToBeChanged.emit()
+        indexes = self.persistentIndexList()
+        slots = [self.slot(index.row()) for index in indexes]
+        self.descending = order == Qt.DescendingOrder
+        if self.result_slots is None:
+            self.sorter.sort(column)
+        else:
+            self.result_slots = self.sorter.sorted_slots(self.result_slots)
+        self.changePersistentIndexList(indexes, [self.index(self.row_of(slot), index.column())
+                                                 for slot, index in zip(slots, indexes)])
+        self.layoutChanged.emit()
+
+    def flags(self, index):
+        if self.read_only:
+            return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def slot(self, row):
+        slots = self.slots()
+        return slots[self.display_row(row, len(slots))]
+
+    def row_of(self, slot):
+        # Sorted search results are not kept in order as cells change, so a
+        # slot is looked for among them.
+        slots = self.slots()
+        if not self.is_sorted():
+            return position(slots, slot)
+        if self.result_slots is None:
+            i = self.sorter.find(slot)
+        else:
+            try:
+                i = slots.index(slot)
+            except ValueError:
+                i = -1
+        return self.display_row(i, len(slots)) if i != -1 else -1
+
+    def load(self, data, source=None):
+        self.beginResetModel()
+        if self.sorter is not None:
+            self.sorter.reset()
+        self.table.load(data, source)
+        self.endResetModel()
+
+    def set_result_slots(self, slots):
+        self.beginResetModel()
+        self.result_slots = self.sorter.sorted_slots(slots) if self.is_sorted() else slots
+        self.endResetModel()
+
+    def append_row(self, values, key=None):
+        if self.is_sorted():
+            slot = self.table.append_row(values, key)
+            self.insert_sorted([slot])
+            return slot
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        slot = self.table.append_row(values, key)
+        self.endInsertRows()
+        return slot
+
+    def append_slot(self, slot):
+        row = self.display_row(self.rowCount(), self.rowCount() + 1)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.result_slots.append(slot)
+        self.endInsertRows()
+
+    def remove_slot(self, slot, record=True):
+        row = self.row_of(slot)
+        if row == -1:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        if self.result_slots is not None:
+            del self.result_slots[self.display_row(row, self.rowCount())]
+        else:
+            if self.is_sorted():
+                del self.sorter.slots[self.display_row(row, self.rowCount())]
+            self.table.remove_slot(slot, record)
+        self.endRemoveRows()
+
+    def update_cells(self):
+        if self.rowCount() and self.columnCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1))
+
+
+class QueryModel(QAbstractTableModel):
+    # Read-only rows streamed from a file by a QueryReader, page by page.
+    def __init__(self, headers):
+        super().__init__()
+        self.headers = headers
+        self.rows = []
+        self.reader = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return str(self.rows[index.row()][index.column()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.reader is not None and not self.reader.done
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        data = self.reader.fetch()
+        if not data:
+            return
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row + len(data) - 1)
+        self.rows.extend(data)
+        self.endInsertRows()
+
+    def set_reader(self, reader):
+        self.beginResetModel()
+        self.reader = reader
+        self.rows = reader.fetch() if reader is not None else []
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.reader = None
+        self.rows = rows
+        self.endResetModel()
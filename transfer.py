@@ -0,0 +1,218 @@
+# Импорт и экспорт таблиц в CSV и JSONL; из командной строки - python -m cli.
+import csv
+import io
+import json
+import os
+import sqlite3
+from consts import ID_COLUMN, FOREIGN_KEYS, TABLE_CONVERSATIONS_I, DB_PARTITION_MAX_ID_REQUEST, \
+    DB_COLUMN_NAMES, DB_CREATE_REQUESTS, DB_INSERT_REQUESTS, DB_SELECT_IDS_REQUESTS, DB_SELECT_ALL_REQUESTS, \
+    ERROR_MESSAGES, DATA_FORMAT_ERROR, DATA_UNIQUE_ERROR, DATA_ID_ERROR, COLUMNS_ERROR_MESSAGE, \
+    TRANSFER_CHUNK_SIZE, REPORT_HEADERS
+from database import OperationCancelled, connect, open_connection, prune_changes, table_sources
+from validation import table_checks
+from profiling import instrumented, add_rows
+
+# Longer keys do not fit into an SQLite integer.
+MAX_KEY_LENGTH = 18
+
+
+def file_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.json')) else 'csv'
+
+
+def read_records(file, index, text_format):
+    # (line number, tuple of cell texts or None if the line does not have
+    # the columns of the table) for every record of the file.
+    names = DB_COLUMN_NAMES[index]
+    if text_format == 'jsonl':
+        for line, text in enumerate(file, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+                yield line, tuple(cell_text(record[name]) for name in names)
+            except (ValueError, TypeError, KeyError):
+                yield line, None
+        return
+
+    reader = csv.reader(file)
+    header = next(reader, None)
+    positions = [header.index(name) if header and name in header else None for name in names]
+    for line, record in enumerate(reader, 2):
+        if None in positions or len(record) != len(header):
+            yield line, None
+        else:
+            yield line, tuple(record[position] for position in positions)
+
+
+def cell_text(value):
+    if value is None or isinstance(value, (dict, list)):
+        raise TypeError(value)
+    return str(value)
+
+
+def existing_ids(cursor, index, ids):
+    ids = list(ids)
+    if not ids:
+        return set()
+    request = DB_SELECT_IDS_REQUESTS[index].format(', '.join('?' * len(ids)))
+    return {item_id for item_id, in cursor.execute(request, ids)}
+
+
+def validate_chunk(cursor, index, chunk):
+    # The rules of the table view: cell formats, IDs that are new to the
+    # file and to the chunk, and foreign keys that exist in the file. Rows
+    # of earlier chunks are already in the file, so they count as well.
+    # Conversation IDs up to the largest one moved into a partition may be
+    # taken there.
+    checks = table_checks(index)
+    key_cols = (ID_COLUMN, *FOREIGN_KEYS) if index == TABLE_CONVERSATIONS_I else (ID_COLUMN,)
+    accepted, rejected, candidates = [], [], []
+    for line, values in chunk:
+        if values is None:
+            rejected.append((line, COLUMNS_ERROR_MESSAGE, ()))
+        elif not all(check(text) for check, text in zip(checks, values)) or \
+                any(len(values[col]) > MAX_KEY_LENGTH for col in key_cols):
+            rejected.append((line, ERROR_MESSAGES[DATA_FORMAT_ERROR], values))
+        else:
+            candidates.append((line, values))
+
+    taken = existing_ids(cursor, index, {int(values[ID_COLUMN]) for _, values in candidates})
+    linked = {}
+    reserved = None
+    if index == TABLE_CONVERSATIONS_I:
+        reserved, = cursor.execute(DB_PARTITION_MAX_ID_REQUEST).fetchone()
+        for col, linked_index in FOREIGN_KEYS.items():
+            linked[col] = existing_ids(cursor, linked_index, {int(values[col]) for _, values in candidates})
+
+    for line, values in candidates:
+        item_id = int(values[ID_COLUMN])
+        if item_id in taken or (reserved is not None and item_id <= reserved):
+            rejected.append((line, ERROR_MESSAGES[DATA_UNIQUE_ERROR], values))
+        elif any(int(values[col]) not in ids for col, ids in linked.items()):
+            rejected.append((line, ERROR_MESSAGES[DATA_ID_ERROR], values))
+        else:
+            taken.add(item_id)
+            accepted.append(values)
+    rejected.sort(key=lambda item: item[0])
+    return accepted, rejected
+
+
+class RejectedReport:
+    # CSV of the rejected lines, created on the first one.
+    def __init__(self, filename, index):
+        self.filename = filename
+        self.headers = REPORT_HEADERS + DB_COLUMN_NAMES[index]
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, rejected):
+        self.count += len(rejected)
+        if not rejected or self.filename is None:
+            return
+        if self.file is None:
+            self.file = open(self.filename, 'w', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.headers)
+        self.writer.writerows((line, reason, *values) for line, reason, values in rejected)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@instrumented()
+def import_table(filename, index, source, report_filename=None, task=None):
+    # Streams `source` into the table in chunks of TRANSFER_CHUNK_SIZE rows,
+    # all in one transaction, so memory does not grow with the file.
+    # Returns (imported rows, rejected rows).
+    connection = connect(filename, isolation_level=None)
+    report = RejectedReport(report_filename, index)
+    size = os.path.getsize(source)
+    imported = 0
+    try:
+        with open(source, 'rb') as raw:
+            file = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            cursor = connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for request in DB_CREATE_REQUESTS:
+                    cursor.execute(request)
+                for chunk in chunks(read_records(file, index, file_format(source)), TRANSFER_CHUNK_SIZE):
+                    if task is not None and task.is_cancelled():
+                        raise OperationCancelled
+                    accepted, rejected = validate_chunk(cursor, index, chunk)
+                    cursor.executemany(DB_INSERT_REQUESTS[index], accepted)
+                    report.write(rejected)
+                    imported += len(accepted)
+                    add_rows(len(chunk))
+                    if task is not None:
+                        task.report(raw.tell(), size)
+                prune_changes(cursor)
+            except (sqlite3.Error, OperationCancelled, UnicodeDecodeError, csv.Error):
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+    finally:
+        report.close()
+        connection.close()
+    return imported, report.count
+
+
+@instrumented()
+def export_table(filename, index, target, base=None, task=None):
+    # Streams the table into `target` in chunks; returns the number of rows.
+    # `base` is the file a partition belongs to (see open_connection()).
+    # Conversations of a split file are exported with its partitions.
+    connection = open_connection(filename, base)
+    names = DB_COLUMN_NAMES[index]
+    text_format = file_format(target)
+    exported = 0
+    try:
+        total = sum(connection.execute(f'SELECT COUNT(*) FROM {source}').fetchone()[0]
+                    for source in table_sources(connection, index))
+        with open(target, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file) if text_format == 'csv' else None
+            if writer is not None:
+                writer.writerow(names)
+            sources = table_sources(connection, index)
+            try:
+                for source in sources:
+                    cursor = connection.execute(DB_SELECT_ALL_REQUESTS[index].format(source))
+                    try:
+                        while rows := cursor.fetchmany(TRANSFER_CHUNK_SIZE):
+                            if task is not None and task.is_cancelled():
+                                raise OperationCancelled
+                            if writer is not None:
+                                writer.writerows(rows)
+                            else:
+                                file.writelines(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+                                                for row in rows)
+                            exported += len(rows)
+                            add_rows(len(rows))
+                            if task is not None:
+                                task.report(exported, total)
+                    finally:
+                        cursor.close()
+            finally:
+                sources.close()
+    finally:
+        connection.close()
+    return exported
+
+
+def report_filename(source):
+    return os.path.splitext(source)[0] + '.rejected.csv'
+
@@ -0,0 +1,209 @@
+import heapq
+from array import array
+import re
+from collections import Counter
+from functools import lru_cache
+from date_check import is_date
+from consts import TABLE_REG_EXPRESSIONS, DATE_CHECK, ID_COLUMN, TABLE_CONVERSATIONS_I, FOREIGN_KEYS, \
+    DATA_CORRECT, DATA_FORMAT_ERROR, DATA_UNIQUE_ERROR, DATA_ID_ERROR
+
+
+@lru_cache(maxsize=None)
+def table_checks(index):
+    # check(text) of every column, true for a correct cell. The expressions
+    # are compiled on the first check of the table, not at startup.
+    return tuple(is_date if reg_exp == DATE_CHECK else re.compile(reg_exp, re.DOTALL).fullmatch
+                 for reg_exp in TABLE_REG_EXPRESSIONS[index])
+
+
+class Validator:
+    # Keeps the validation state of every loaded cell up to date as cells,
+    # rows and IDs change, so the overall status and the first incorrect
+    # cell are known without rechecking the tables.
+    def __init__(self, data_tables):
+        self.data_tables = data_tables
+        self.error_counts = Counter()
+        self.incorrect_cells = []
+        # (table index, ID) of callers and cities that conversations in
+        # partitions refer to and no row has any more.
+        self.missing_ids = set()
+        # Foreign key column of conversations -> ID text -> array of the
+        # slots of loaded conversations that have it, so a changed ID
+        # rechecks only the cells that point to it. It is made when an ID
+        # first changes (see referring_slots()), not for every opened file.
+        self.references = None
+
+    def reset(self):
+        for data_table in self.data_tables:
+            data_table.invalid.clear()
+        self.error_counts.clear()
+        self.incorrect_cells = []
+        self.missing_ids.clear()
+        self.references = None
+
+    def status(self):
+        for status in (DATA_ID_ERROR, DATA_UNIQUE_ERROR, DATA_FORMAT_ERROR):
+            if self.error_counts[status]:
+                return status
+        return DATA_CORRECT
+
+    def first_incorrect_cell(self):
+        cells = self.incorrect_cells
+        while cells:
+            index, slot, col = cells[0]
+            if (slot, col) in self.data_tables[index].invalid:
+                return cells[0]
+            heapq.heappop(cells)
+        return None
+
+    def cell_status(self, index, slot, col, linked_ids=None):
+        # `linked_ids` caches the answers for foreign keys while a batch of
+        # rows is checked, as the linked tables do not change meanwhile.
+        data_table = self.data_tables[index]
+        text = data_table.value(slot, col)
+
+        if not table_checks(index)[col](text):
+            return DATA_FORMAT_ERROR
+
+        if col == ID_COLUMN and (data_table.slot_id_count(slot) > 1 or data_table.has_unloaded_id(text)):
+            return DATA_UNIQUE_ERROR
+
+        if index == TABLE_CONVERSATIONS_I and col in FOREIGN_KEYS:
+            found = linked_ids.get((col, text)) if linked_ids is not None else None
+            if found is None:
+                linked_table = self.data_tables[FOREIGN_KEYS[col]]
+                found = linked_table.has_id(text) or linked_table.has_unloaded_id(text)
+                if linked_ids is not None:
+                    linked_ids[col, text] = found
+            if not found:
+                return DATA_ID_ERROR
+
+        return DATA_CORRECT
+
+    def set_cell_status(self, index, slot, col, status):
+        invalid = self.data_tables[index].invalid
+        old_status = invalid.get((slot, col), DATA_CORRECT)
+        if old_status == status:
+            return
+        if old_status != DATA_CORRECT:
+            self.error_counts[old_status] -= 1
+        if status == DATA_CORRECT:
+            del invalid[slot, col]
+        else:
+            invalid[slot, col] = status
+            self.error_counts[status] += 1
+            heapq.heappush(self.incorrect_cells, (index, slot, col))
+
+    def check_cell(self, index, slot, col, linked_ids=None):
+        status = self.cell_status(index, slot, col, linked_ids)
+        self.set_cell_status(index, slot, col, status)
+        return status == DATA_CORRECT
+
+    def cell_changed(self, index, slot, col, old_text):
+        self.check_cell(index, slot, col)
+        new_text = self.data_tables[index].value(slot, col)
+        if index == TABLE_CONVERSATIONS_I and col in FOREIGN_KEYS and old_text != new_text and \
+                self.references is not None:
+            self.remove_reference(col, old_text, slot)
+            self.add_reference(col, new_text, slot)
+        if col == ID_COLUMN and old_text != new_text:
+            self.id_removed(index, old_text)
+            self.id_added(index, new_text)
+
+    def rows_added(self, index, slots):
+        data_table = self.data_tables[index]
+        linked_ids = {}
+        for slot in slots:
+            for col in range(data_table.column_count()):
+                self.check_cell(index, slot, col, linked_ids)
+        if index == TABLE_CONVERSATIONS_I and self.references is not None:
+            for col in FOREIGN_KEYS:
+                for slot in slots:
+                    self.add_reference(col, data_table.value(slot, col), slot)
+        for slot in slots:
+            self.id_added(index, data_table.value(slot, ID_COLUMN), data_table.slot_id_count(slot))
+
+    def row_removed(self, index, slot, text):
+        # Called after the row has left the table; `text` is the ID it had.
+        invalid = self.data_tables[index].invalid
+        for col in range(self.data_tables[index].column_count()):
+            if (slot, col) in invalid:
+                self.set_cell_status(index, slot, col, DATA_CORRECT)
+        if index == TABLE_CONVERSATIONS_I and self.references is not None:
+            for col in FOREIGN_KEYS:
+                self.remove_reference(col, self.data_tables[index].value(slot, col), slot)
+        self.id_removed(index, text)
+
+    def referring_slots(self, col, text):
+        if self.references is None:
+            self.references = {col: {} for col in FOREIGN_KEYS}
+            conversations = self.data_tables[TABLE_CONVERSATIONS_I]
+            for reference_col in FOREIGN_KEYS:
+                for slot in conversations.order:
+                    self.add_reference(reference_col, conversations.value(slot, reference_col), slot)
+        return self.references[col].get(text, ())
+
+    def add_reference(self, col, text, slot):
+        slots = self.references[col].get(text)
+        if slots is None:
+            self.references[col][text] = array('i', (slot,))
+        else:
+            slots.append(slot)
+
+    def remove_reference(self, col, text, slot):
+        slots = self.references[col].get(text)
+        if slots is not None and slot in slots:
+            slots.remove(slot)
+            if not slots:
+                del self.references[col][text]
+
+    def id_added(self, index, text, count=None):
+        data_table = self.data_tables[index]
+        if count is None:
+            count = data_table.id_count(text)
+        if count == 2:
+            for slot in data_table.slots_with_id(text):
+                self.check_cell(index, slot, ID_COLUMN)
+        elif count == 1:
+            self.check_references(index, text, only_invalid=True)
+
+    def id_removed(self, index, text):
+        data_table = self.data_tables[index]
+        count = data_table.id_count(text)
+        if count == 1:
+            for slot in data_table.slots_with_id(text):
+                self.check_cell(index, slot, ID_COLUMN)
+        elif count == 0:
+            self.check_references(index, text, only_invalid=False)
+
+    def check_references(self, index, text, only_invalid):
+        # An ID of a linked table appeared or disappeared: recheck the
+        # conversation cells that point to it. A new ID can only fix cells
+        # that are already incorrect, so until the cells of every ID are
+        # indexed, as when the tables are loaded, only those are looked at.
+        conversations = self.data_tables[TABLE_CONVERSATIONS_I]
+        cols = [col for col, linked_index in FOREIGN_KEYS.items() if linked_index == index]
+        if not cols:
+            return
+        linked_table = self.data_tables[index]
+        if linked_table.has_partition_reference(text):
+            self.set_missing_id(index, text, not (linked_table.has_id(text) or linked_table.has_unloaded_id(text)))
+        if only_invalid and self.references is None:
+            cells = [cell for cell, status in conversations.invalid.items()
+                     if status == DATA_ID_ERROR and cell[1] in cols and conversations.value(*cell) == text]
+        else:
+            cells = [(slot, col) for col in cols for slot in self.referring_slots(col, text)]
+        for slot, col in cells:
+            self.check_cell(TABLE_CONVERSATIONS_I, slot, col)
+
+    def set_missing_id(self, index, text, missing):
+        # Conversations in partitions are not loaded, so an ID they refer to
+        # has no cell to mark: it is counted as an error while it is missing.
+        if missing == ((index, text) in self.missing_ids):
+            return
+        if missing:
+            self.missing_ids.add((index, text))
+            self.error_counts[DATA_ID_ERROR] += 1
+        else:
+            self.missing_ids.discard((index, text))
+            self.error_counts[DATA_ID_ERROR] -= 1
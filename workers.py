@@ -0,0 +1,113 @@
+import threading
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QEventLoop, pyqtSignal
+from PyQt5.QtWidgets import QProgressDialog
+from consts import MAX_PENDING_BATCHES, CANCEL_TEXT
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, int)
+    batch = pyqtSignal(object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    # Runs function(*args, task=worker) on the thread pool. The function
+    # reports progress, checks for cancellation and passes batches of data
+    # back through the worker; at most MAX_PENDING_BATCHES batches wait in
+    # the GUI thread at a time, so a fast reader cannot flood the event loop.
+    def __init__(self, function, *args):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.function = function
+        self.args = args
+        self.signals = WorkerSignals()
+        self.cancelled = threading.Event()
+        self.pending_batches = threading.Semaphore(MAX_PENDING_BATCHES)
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            result = self.function(*self.args, task=self)
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.pending_batches.release()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def report(self, done, total):
+        self.signals.progress.emit(done, total)
+
+    def send(self, data):
+        while not self.pending_batches.acquire(timeout=0.1):
+            if self.is_cancelled():
+                return
+        if not self.is_cancelled():
+            self.signals.batch.emit(data)
+
+    def batch_done(self):
+        self.pending_batches.release()
+
+
+class BackgroundTask:
+    # Shows a cancellable progress dialog and spins a local event loop until
+    # the worker ends, so the calling code stays sequential while the window
+    # keeps repainting and responding.
+    def __init__(self, parent, title, function, *args, on_batch=None):
+        self.worker = Worker(function, *args)
+        self.on_batch = on_batch
+        self.loop = QEventLoop()
+
+        self.dialog = QProgressDialog(title, CANCEL_TEXT, 0, 0, parent)
+        self.dialog.setWindowModality(Qt.WindowModal)
+        self.dialog.setMinimumDuration(500)
+        self.dialog.canceled.connect(self.worker.cancel)
+
+        self.worker.signals.progress.connect(self.update_progress)
+        self.worker.signals.batch.connect(self.handle_batch)
+        self.worker.signals.finished.connect(self.finish)
+        self.worker.signals.failed.connect(self.fail)
+
+    def run(self):
+        QThreadPool.globalInstance().start(self.worker)
+        self.loop.exec_()
+        self.dialog.canceled.disconnect(self.worker.cancel)
+        self.dialog.close()
+        self.dialog.deleteLater()
+        return self
+
+    @property
+    def cancelled(self):
+        return self.worker.is_cancelled()
+
+    @property
+    def error(self):
+        return self.worker.error
+
+    @property
+    def result(self):
+        return self.worker.result
+
+    def update_progress(self, done, total):
+        self.dialog.setMaximum(total)
+        self.dialog.setValue(min(done, total))
+
+    def handle_batch(self, data):
+        if not self.worker.is_cancelled() and self.on_batch is not None:
+            self.on_batch(data)
+        self.worker.batch_done()
+
+    def finish(self, result):
+        self.worker.result = result
+        self.loop.quit()
+
+    def fail(self, error):
+        self.worker.error = error
+        self.loop.quit()